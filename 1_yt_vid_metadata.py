@@ -3,58 +3,49 @@ Use youtube data API v3 to get metadata for the videos in watdh history
 """
 
 from pathlib import Path
-from datetime import datetime, timezone
 import os
 import re
 import json
 import requests
-import hashlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+from history import DEFAULT_END, DEFAULT_START, in_window
+from key_scheduler import get_limiter, get_scheduler
+from metadata_store import get_store
+from video_metadata import VideoMetadata, parse_timestamp
+from yt_session import connection_count, response_size
+from yt_transport import get_transport
 
-load_dotenv()
-KEY_STATE_FILE = "api_key_status.json"
-
-
-def get_working_keys():
-    items = [
-        val for key, val in os.environ.items() if key.startswith("YT_API_") and val
-    ]
-    if not items:
-        raise RuntimeError("No YT_API keys found in .env file")
 
-    state = {}
-    if os.path.exists(KEY_STATE_FILE):
-        try:
-            with open(KEY_STATE_FILE, "r") as f:
-                state = json.load(f)
-        except Exception:
-            pass
-
-    today = datetime.now().strftime("%Y-%m-%d")
-    valid = []
-    for k in items:
-        k_hash = hashlib.sha256(k.encode()).hexdigest()
-        if state.get(k_hash) != today:
-            valid.append(k)
-    return valid
-
-
-def mark_key_exhausted(key):
-    k_hash = hashlib.sha256(key.encode()).hexdigest()
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    state = {}
-    if os.path.exists(KEY_STATE_FILE):
-        try:
-            with open(KEY_STATE_FILE, "r") as f:
-                state = json.load(f)
-        except Exception:
-            pass
-
-    state[k_hash] = today
-    with open(KEY_STATE_FILE, "w") as f:
-        json.dump(state, f)
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Concurrent fetching: worker threads overall (per-key caps are in key_scheduler)
+FETCH_WORKERS = int(os.environ.get("YT_FETCH_WORKERS", 8))
+# Seconds between checks for ids another job is fetching
+CLAIM_POLL = float(os.environ.get("YWH_METADATA_CLAIM_POLL", 0.25))
+
+# Ids per videos.list call (the API maximum)
+BATCH_SIZE = 50
+# 403 reasons that mean "slow down" rather than "quota spent for today"
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+# Overridable to point at a local stub (see benchmarks/)
+VIDEOS_URL = os.environ.get(
+    "YT_VIDEOS_URL", "https://www.googleapis.com/youtube/v3/videos"
+)
+# Only the attributes the merge step reads
+VIDEO_FIELDS = (
+    "items(id,"
+    "snippet(title,channelTitle,publishedAt,categoryId),"
+    "contentDetails(duration),"
+    "statistics(viewCount,likeCount))"
+)
 
 
 def iso8601_to_seconds(duration):
@@ -75,80 +66,105 @@ def iso8601_to_seconds(duration):
     return h * 3600 + m * 60 + s
 
 
-def iso_to_mysql(ts):
-    """
-    Convert ISO-8601 timestamp to MySQL DATETIME format.
-    """
-    if not ts:
-        return ""
-
-    try:
-        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        return dt.strftime("%Y-%m-%d %H:%M:%S")
-    except Exception:
-        return ""
-
-
-def entry_year(entry):
-    """
-    Return the year component of the watch history entry timestamp.
-    """
-    raw_time = entry.get("time")
-    if not raw_time:
-        return None
-
+def error_reason(response):
+    """First error reason of an API error response ("quotaExceeded", ...)."""
     try:
-        return datetime.fromisoformat(raw_time.replace("Z", "+00:00")).year
-    except ValueError:
+        return response.json()["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError):
         return None
 
 
 # ------------------ API FETCH ------------------
 
 
-def fetch_metadata(video_ids, watch_times=None):
-    watch_times = watch_times or {}
-    results = {}
-    batch = []
-
-    current_keys = get_working_keys()
-    if not current_keys:
-        raise RuntimeError(
-            "All configured API keys are exhausted for today or missing."
-        )
+def fetch_metadata(video_ids, stats=None, workers=None, progress=None):
+    """
+    Return {video_id: VideoMetadata}. Ids found in the persistent store are served
+    locally; the rest are requested from the API and written back. Ids the
+    API did not return recently (deleted or private videos) are skipped
+    without a request, and newly not-returned ids are remembered.
+    Cache hit/miss counts are added to `stats` when given.
+
+    Missing ids are claimed in the store first. Ids another job (in this or
+    any other process sharing the store) is already fetching are not
+    requested again: this call waits for that job to store them. Claimed ids
+    are packed into batches of 50, fetched by up to `workers` threads
+    (FETCH_WORKERS by default, 1 = serial). `progress(done, total)` is called
+    as batches complete. Batch count, bytes received, new connections, ids
+    received from other jobs ("coalesced"), and skipped and newly found
+    unavailable ids ("known_unavailable", "not_returned") are added to `stats`.
+    """
+    stats = stats if stats is not None else {}
+    workers = workers or FETCH_WORKERS
+    store = get_store()
+
+    video_ids = list(video_ids)
+    results = store.get_many(video_ids)
+
+    missing = [vid for vid in video_ids if vid not in results]
+    unavailable = store.get_unavailable(missing)
+    missing = [vid for vid in missing if vid not in unavailable]
+    stats["cache_hits"] = stats.get("cache_hits", 0) + len(results)
+    stats["cache_misses"] = stats.get("cache_misses", 0) + len(missing)
+    stats["known_unavailable"] = stats.get("known_unavailable", 0) + len(unavailable)
+    if not missing:
+        return results
+
+    scheduler = get_scheduler()
+    stats_lock = threading.Lock()
+    transport = get_transport()
+    connections_before = connection_count(VIDEOS_URL)
+    transfer = {"requests": 0, "bytes": 0, "not_returned": 0}
+    owner = uuid.uuid4().hex
 
     def query(ids):
-        nonlocal current_keys
-        url = "https://www.googleapis.com/youtube/v3/videos"
         params = {
             "id": ",".join(ids),
-            "part": "snippet,contentDetails,statistics,topicDetails",
+            "part": "snippet,contentDetails,statistics",
+            "fields": VIDEO_FIELDS,
         }
 
         last_err = None
         response_json = None
-        idx = 0
-
-        while idx < len(current_keys):
-            key = current_keys[idx]
-            params["key"] = key
+        failed = set()
+
+        while True:
+            # Each videos.list call costs one quota unit
+            key = scheduler.acquire(cost=1, exclude=failed)
+            if key is None:
+                # Wait out rate-limit cooldowns; give up once keys are spent
+                wait = scheduler.cooldown_left(exclude=failed)
+                if wait is None:
+                    break
+                time.sleep(wait)
+                continue
 
             try:
-                r = requests.get(url, params=params, timeout=30)
+                with get_limiter(key):
+                    r = transport.get(
+                        VIDEOS_URL, params={**params, "key": key}, timeout=30
+                    )
+                with stats_lock:
+                    transfer["requests"] += 1
+                    transfer["bytes"] += response_size(r)
 
                 if r.status_code in (403, 429):
-                    mark_key_exhausted(key)
-                    current_keys.pop(idx)
-                    # Do not increment idx, next key slides in
+                    if r.status_code == 429 or error_reason(r) in RATE_LIMIT_REASONS:
+                        # Short-term throttling: rest the key, keep its quota
+                        scheduler.cool_down(key)
+                    else:
+                        scheduler.mark_exhausted(key)
                     continue
 
                 r.raise_for_status()
                 response_json = r.json()
+                # Replayed ids missing from the cassette say nothing about the video
+                unrecorded = set(getattr(r, "unrecorded", ()))
                 break
 
             except requests.RequestException as exc:
                 last_err = exc
-                idx += 1  # Try next available key
+                failed.add(key)  # Try next available key
                 continue
 
         if response_json is None:
@@ -156,90 +172,169 @@ def fetch_metadata(video_ids, watch_times=None):
                 raise last_err
             raise RuntimeError("All keys failed or exhausted.")
 
+        batch_results = {}
         for item in response_json.get("items", []):
-            results[item["id"]] = {
-                "video_id": item["id"],
-                "fetched_at": datetime.now(timezone.utc).isoformat(),
-                "watched_at_sql": watch_times.get(item["id"], {}).get("watched_at_sql"),
-                "snippet": {
-                    "title": item["snippet"]["title"],
-                    "channelTitle": item["snippet"]["channelTitle"],
-                    "publishedAt_sql": iso_to_mysql(item["snippet"]["publishedAt"]),
-                    "categoryId": item["snippet"]["categoryId"],
-                },
-                "contentDetails": {
-                    "duration_seconds": iso8601_to_seconds(
-                        item["contentDetails"]["duration"]
-                    ),
-                    "definition": item["contentDetails"].get("definition"),
-                    "caption": item["contentDetails"].get("caption"),
-                },
-                "statistics": {
-                    "viewCount": int(item["statistics"].get("viewCount", 0)),
-                    "likeCount": int(item["statistics"].get("likeCount", 0)),
-                },
-                "topicDetails": item.get("topicDetails", {}),
-            }
-
-    for vid in video_ids:
-        batch.append(vid)
-        if len(batch) == 50:
-            query(batch)
-            batch.clear()
-
-    if batch:
-        query(batch)
+            snippet = item["snippet"]
+            statistics = item.get("statistics", {})
+            batch_results[item["id"]] = VideoMetadata(
+                item["id"],
+                snippet["title"],
+                snippet["channelTitle"],
+                parse_timestamp(snippet["publishedAt"]),
+                snippet["categoryId"],
+                iso8601_to_seconds(item["contentDetails"]["duration"]),
+                int(statistics.get("viewCount", 0)),
+                int(statistics.get("likeCount", 0)),
+            )
+
+        not_returned = [
+            vid for vid in ids if vid not in batch_results and vid not in unrecorded
+        ]
+        with stats_lock:
+            transfer["not_returned"] += len(not_returned)
+
+        # Stored before the claims are dropped, so waiting jobs find it
+        store.put_many(batch_results, evict=False)
+        store.put_unavailable(not_returned)
+        store.release(ids, owner)
+        return batch_results
+
+    fetched = {}
+    coalesced = {}
+    claimed = set()
+    total = -(-len(missing) // BATCH_SIZE)
+    done = {"ids": 0}
+
+    def report(n_ids):
+        with stats_lock:
+            done["ids"] += n_ids
+            completed = min(total, -(-done["ids"] // BATCH_SIZE))
+        if progress:
+            progress(completed, total)
+
+    def fetch_claimed(ids):
+        scheduler.refresh()
+        if not scheduler.working_keys():
+            raise RuntimeError(
+                "All configured API keys are exhausted for today or missing."
+            )
+
+        batches = [ids[i : i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+        batch_results = [None] * len(batches)
+        try:
+            if workers <= 1 or len(batches) == 1:
+                for i, batch in enumerate(batches):
+                    batch_results[i] = query(batch)
+                    report(len(batch))
+            else:
+                with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+                    futures = {pool.submit(query, batch): i for i, batch in enumerate(batches)}
+                    try:
+                        for future in as_completed(futures):
+                            i = futures[future]
+                            batch_results[i] = future.result()
+                            report(len(batches[i]))
+                    except BaseException:
+                        for future in futures:
+                            future.cancel()
+                        raise
+        finally:
+            # Merge in batch order so the result matches the serial path, and
+            # keep whatever was fetched before a failure
+            for batch in batch_results:
+                if batch:
+                    fetched.update(batch)
+
+    def wait_for(ids):
+        """
+        Wait until other jobs have stored `ids`. Returns the ids they gave
+        up on (failed, or not returned by the API) for another claim.
+        """
+        waiting = set(ids)
+        while waiting:
+            time.sleep(CLAIM_POLL)
+            # Claims first: an owner stores its results before releasing them
+            held = store.claimed(waiting)
+            found = store.get_many(waiting)
+            coalesced.update(found)
+            waiting.difference_update(found)
+            gone = store.get_unavailable(waiting)
+            waiting.difference_update(gone)
+            report(len(found) + len(gone))
+            if waiting - held:
+                return list(waiting)
+        return []
+
+    pending = missing
+    try:
+        while pending:
+            own, taken = store.claim(pending, owner)
+            claimed.update(own)
+            # Stored by another job between the lookup and the claim
+            found = store.get_many(own)
+            found_ids = set(found) | store.get_unavailable(own)
+            if found_ids:
+                coalesced.update(found)
+                report(len(found_ids))
+                store.release(found_ids, owner)
+                own = [vid for vid in own if vid not in found_ids]
+            if own:
+                fetch_claimed(own)
+            pending = wait_for(taken)
+    finally:
+        store.release(claimed, owner)
+        store.evict()
+        scheduler.save()
+        transport.save()
+
+        connections = connection_count(VIDEOS_URL) - connections_before
+        stats["api_requests"] = stats.get("api_requests", 0) + transfer["requests"]
+        stats["bytes_received"] = stats.get("bytes_received", 0) + transfer["bytes"]
+        stats["connections_opened"] = stats.get("connections_opened", 0) + connections
+        stats["coalesced"] = stats.get("coalesced", 0) + len(coalesced)
+        stats["not_returned"] = stats.get("not_returned", 0) + transfer["not_returned"]
+        logger.info(
+            "Fetched %d ids in %d requests (%d from other jobs, %d not returned, "
+            "%d skipped as unavailable): %d bytes received, %d new connections",
+            len(fetched),
+            transfer["requests"],
+            len(coalesced),
+            transfer["not_returned"],
+            len(unavailable),
+            transfer["bytes"],
+            connections,
+        )
 
+    results.update(fetched)
+    results.update(coalesced)
     return results
 
 
-def run(watch_data):
+def run(watch_data, stats=None, progress=None, start=DEFAULT_START, end=DEFAULT_END):
+    """
+    Select the entries watched between `start` and `end` (inclusive dates,
+    None = open) and fetch metadata for the videos in that window only.
+    Returns (history_window, records), records being VideoMetadata.
+    """
     if isinstance(watch_data, str) and os.path.exists(watch_data):
         with open(watch_data, "r", encoding="utf-8") as f:
             history = json.load(f)
     else:
         history = watch_data
 
-    history_2025 = [e for e in history if entry_year(e) == 2025]
+    history_window = [e for e in history if in_window(e.get("time"), start, end)]
 
-    watch_times = {}
     video_ids = set()
 
-    for e in history_2025:
+    for e in history_window:
         if "titleUrl" not in e or "watch?v=" not in e["titleUrl"]:
             continue
 
         vid = e["titleUrl"].replace("\\u003d", "=").split("watch?v=")[1].split("&")[0]
         video_ids.add(vid)
 
-        iso_time = e.get("time")
-        if vid not in watch_times:
-            watch_times[vid] = {
-                "watched_at_sql": iso_to_mysql(iso_time),
-            }
-
-    cache = {}
-    missing = [vid for vid in video_ids if vid not in cache]
-
-    if missing:
-        fetched = fetch_metadata(missing, watch_times)
-        cache.update(fetched)
-
-    # Backfill watch and SQL time fields for cached entries we already had
-    for vid in video_ids:
-        if vid not in cache:
-            continue
-
-        wt = watch_times.get(vid)
-        if wt:
-            cache[vid]["watched_at_sql"] = wt.get("watched_at_sql")
-
-        snippet = cache[vid].get("snippet")
-        if snippet:
-            if "publishedAt" in snippet:
-                snippet["publishedAt_sql"] = iso_to_mysql(snippet["publishedAt"])
-                snippet.pop("publishedAt", None)
-            elif "publishedAt_sql" not in snippet:
-                snippet["publishedAt_sql"] = ""
+    records = {}
+    if video_ids:
+        records = fetch_metadata(video_ids, stats=stats, progress=progress)
 
-    return history_2025, list(cache.values())
+    return history_window, list(records.values())
@@ -1,9 +1,15 @@
 """
 Merge watch history entries with cached video metadata and return a DataFrame.
+
+watched_at and published_at are parsed here, once, into UTC datetime columns
+that the later steps use as-is.
 """
 
+import numpy as np
 import pandas as pd
 
+from video_metadata import VideoMetadata
+
 
 # Category mapping
 CATEGORY_MAP = {
@@ -40,78 +46,82 @@ CATEGORY_MAP = {
 }
 
 
-def run(watch_history, cache_list):
-    cache_by_id = {v["video_id"]: v for v in cache_list}
-
-    merged_rows = []
-
-    for entry in watch_history:
-        if "titleUrl" not in entry or "watch?v=" not in entry["titleUrl"]:
-            continue
-
-        video_id = (
-            entry["titleUrl"].replace("\\u003d", "=").split("watch?v=")[1].split("&")[0]
-        )
-
-        watched_at = entry.get("time")
-        video_meta = cache_by_id.get(video_id)
-
-        duration_seconds = (
-            video_meta["contentDetails"]["duration_seconds"]
-            if video_meta and video_meta.get("contentDetails")
-            else None
-        )
-
-        video_type = (
-            "Short" if duration_seconds and duration_seconds <= 90 else "Long-form"
-        )
-
-        category_id = (
-            video_meta["snippet"].get("categoryId")
-            if video_meta and video_meta.get("snippet")
-            else None
-        )
-        category_name = (
-            CATEGORY_MAP.get(str(category_id), "Unknown") if category_id else None
-        )
-
-        channel_title = (
-            video_meta["snippet"].get("channelTitle")
-            if video_meta and video_meta.get("snippet")
-            else None
-        )
-
-        merged_rows.append(
-            {
-                "title": (
-                    video_meta["snippet"].get("title")
-                    if video_meta and video_meta.get("snippet")
-                    else entry.get("title")
-                ),
-                "channel": channel_title,
-                "watched_at": watched_at,
-                "published_at": (
-                    video_meta["snippet"].get("publishedAt_sql")
-                    if video_meta and video_meta.get("snippet")
-                    else None
-                ),
-                "url": f"https://www.youtube.com/watch?v={video_id}",
-                "video_id": video_id,
-                "category_id": category_id,
-                "category": category_name,
-                "duration_seconds": duration_seconds,
-                "views": (
-                    video_meta["statistics"].get("viewCount")
-                    if video_meta and video_meta.get("statistics")
-                    else None
-                ),
-                "likes": (
-                    video_meta["statistics"].get("likeCount")
-                    if video_meta and video_meta.get("statistics")
-                    else None
-                ),
-                "type": video_type,
-            }
-        )
-
-    return pd.DataFrame(merged_rows)
+# Video id: everything after the first "watch?v=" up to the next "&"
+VIDEO_ID_PATTERN = r"watch\?v=([^&]*)"
+
+COLUMNS = [
+    "title",
+    "channel",
+    "watched_at",
+    "published_at",
+    "url",
+    "video_id",
+    "category_id",
+    "category",
+    "duration_seconds",
+    "views",
+    "likes",
+    "type",
+]
+
+
+def extract_video_ids(urls):
+    """
+    Vectorized video id extraction; NaN where the URL is not a watch?v= link.
+    """
+    urls = urls.str.replace("\\u003d", "=", regex=False)
+    return urls.str.extract(VIDEO_ID_PATTERN, expand=False)
+
+
+def metadata_frame(records):
+    """
+    One row per video from VideoMetadata records.
+    """
+    meta = pd.DataFrame.from_records(
+        [r.to_row() for r in records], columns=list(VideoMetadata.__slots__)
+    ).rename(columns={"title": "meta_title"})
+    meta["has_snippet"] = True
+    # Later records win, like the dict lookup this replaces
+    meta = meta.drop_duplicates("video_id", keep="last")
+    meta["published_at"] = pd.to_datetime(
+        pd.to_numeric(meta["published_at"]), unit="s", utc=True
+    )
+
+    has_category = meta["category_id"].notna() & (meta["category_id"] != "")
+    meta["category"] = (
+        meta["category_id"]
+        .astype(str)
+        .map(CATEGORY_MAP)
+        .fillna("Unknown")
+        .where(has_category, None)
+    )
+
+    duration = meta["duration_seconds"]
+    meta["type"] = np.where(
+        duration.notna() & (duration != 0) & (duration <= 90), "Short", "Long-form"
+    )
+    return meta
+
+
+def run(watch_history, records):
+    history = pd.DataFrame.from_records(
+        watch_history, columns=["title", "titleUrl", "time"]
+    )
+    history["video_id"] = extract_video_ids(history["titleUrl"].fillna("").astype(str))
+    history = history[history["video_id"].notna()]
+
+    df = history.merge(metadata_frame(records), on="video_id", how="left")
+
+    df["title"] = df["meta_title"].where(
+        df["has_snippet"].fillna(False).astype(bool), df["title"]
+    )
+    df["watched_at"] = pd.to_datetime(
+        df["time"], format="ISO8601", utc=True, errors="coerce"
+    )
+    # Epoch seconds parse at second resolution; match the watch times
+    df["published_at"] = df["published_at"].astype(df["watched_at"].dtype)
+    df["url"] = "https://www.youtube.com/watch?v=" + df["video_id"]
+    # Videos without metadata have no duration, so they count as long-form
+    df["type"] = df["type"].fillna("Long-form")
+
+    return df[COLUMNS].reset_index(drop=True)
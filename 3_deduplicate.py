@@ -1,28 +1,81 @@
 """
-Deduplicate non-music videos by title.
+Deduplicate non-music videos: keep the last watch of each normalized title
+(or of each video id with YWH_DEDUP_KEY=video_id).
+
+Titles and categories are normalized once per distinct value and the title
+is hashed into a uint64 key. Rows are ordered with a single stable sort, and
+the last watch per key is picked with one grouped reduction.
 """
 
+import os
+
+import numpy as np
 import pandas as pd
 
 
-def run(df):
-    df = df.copy()
-    df["watched_at"] = pd.to_datetime(df["watched_at"], errors="coerce")
+# "title" (normalized title) or "video_id"
+DEDUP_KEY = os.environ.get("YWH_DEDUP_KEY", "title")
+
+
+def _distinct(values, normalize=True):
+    """
+    Codes into the distinct values, which are stripped and lowercased if
+    `normalize`. A trailing "" is appended for code -1 (missing values).
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=values.dtype)
+    if normalize:
+        uniques = uniques.str.strip().str.lower()
+    uniques = pd.concat([uniques, pd.Series([""], dtype=uniques.dtype)], ignore_index=True)
+    return codes, uniques.fillna("")
+
+
+def is_music(df):
+    """Boolean array: category is "music" after normalization."""
+    codes, categories = _distinct(df["category"])
+    return (categories == "music").to_numpy(dtype=bool)[codes]
+
+
+def dedup_keys(df, key=DEDUP_KEY):
+    """uint64 deduplication key per row."""
+    if key not in ("title", "video_id"):
+        raise ValueError(f"Unknown dedup key: {key}")
+    codes, uniques = _distinct(df[key], normalize=key == "title")
+    return pd.util.hash_pandas_object(uniques, index=False).to_numpy()[codes]
+
 
-    df["title_norm"] = df["title"].fillna("").str.strip().str.lower()
+def watch_order(watched_at, music):
+    """
+    Row positions ordered by watch time. Ties keep music rows first, then
+    input order, as the old concat-then-sort implementation did.
+    """
+    watched = np.asarray(watched_at.dt.tz_convert(None) if watched_at.dt.tz else watched_at)
+    return np.lexsort((~music, watched))
 
-    df["category_norm"] = df["category"].fillna("").str.strip().str.lower()
 
-    music_df = df[df["category_norm"] == "music"]
-    non_music_df = df[df["category_norm"] != "music"]
+def latest_per_key(keys, order, music):
+    """Boolean array: music rows and the last watch (in `order`) of each key."""
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    non_music = ~music
+    last = pd.Series(rank[non_music]).groupby(keys[non_music], sort=False).max()
+    keep = music.copy()
+    keep[order[last.to_numpy()]] = True
+    return keep
 
-    non_music_dedup = non_music_df.sort_values("watched_at").drop_duplicates(
-        subset=["title_norm"], keep="last"
-    )
 
-    final_df = pd.concat([music_df, non_music_dedup], ignore_index=True)
-    final_df = final_df.sort_values("watched_at")
+def run(df, key=DEDUP_KEY):
+    if not pd.api.types.is_datetime64_any_dtype(df["watched_at"]):
+        df = df.assign(
+            watched_at=pd.to_datetime(
+                df["watched_at"], errors="coerce", utc=True, format="ISO8601"
+            )
+        )
 
-    final_df = final_df.drop(columns=["title_norm", "category_norm"])
+    music = is_music(df)
+    order = watch_order(df["watched_at"], music)
+    keep = latest_per_key(dedup_keys(df, key), order, music)
 
+    final_df = df.take(order[keep[order]])
+    final_df.index = pd.RangeIndex(len(final_df))
     return final_df
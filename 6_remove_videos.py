@@ -11,5 +11,5 @@ def run(df):
     df["duration_seconds"] = pd.to_numeric(df["duration_seconds"], errors="coerce")
     df["duration_seconds"] = df["duration_seconds"].clip(upper=14400)
 
-    df_clean = df.sort_values("watched_at").reset_index(drop=True)
+    df_clean = df.sort_values("watched_at", kind="stable").reset_index(drop=True)
     return df_clean
@@ -5,14 +5,21 @@ Floor watched_at and published_at to the hour.
 import pandas as pd
 
 
+def to_naive_utc(col):
+    """
+    UTC timestamps without tz info; strings are parsed only if not yet datetime.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(col):
+        col = pd.to_datetime(col, errors="coerce", utc=True, format="ISO8601")
+    if col.dt.tz is not None:
+        col = col.dt.tz_convert(None)
+    return col
+
+
 def run(df):
     df = df.copy()
-    df["watched_at"] = pd.to_datetime(
-        df["watched_at"], errors="coerce", utc=True
-    ).dt.tz_convert(None)
-    df["published_at"] = pd.to_datetime(
-        df.get("published_at"), errors="coerce", utc=True
-    ).dt.tz_convert(None)
+    df["watched_at"] = to_naive_utc(df["watched_at"])
+    df["published_at"] = to_naive_utc(df.get("published_at"))
 
     df["watched_at"] = df["watched_at"].dt.floor("h")
     if "published_at" in df.columns:
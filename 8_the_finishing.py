@@ -7,6 +7,9 @@ import pandas as pd
 
 def run(df):
     df = df.copy()
-    df["watched_at"] = pd.to_datetime(df["watched_at"])
+    if not pd.api.types.is_datetime64_any_dtype(df["watched_at"]):
+        df["watched_at"] = pd.to_datetime(
+            df["watched_at"], errors="coerce", utc=True, format="ISO8601"
+        )
     df["day_of_week"] = df["watched_at"].dt.day_name()
     return df
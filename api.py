@@ -0,0 +1,190 @@
+"""
+HTTP API around pipeline.py, for frontends and tools that do not need the
+Streamlit app.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+POST the raw watch-history.json as the request body to /jobs (it is streamed
+to a temporary file, never held in memory as a whole), poll /jobs/{id} until
+it is done, then fetch /results/{result}/... . Results are read from the
+result cache, so they are shared with the Streamlit app and other replicas
+using the same cache directory.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import date
+from functools import partial
+from typing import Optional
+import hashlib
+import io
+import tempfile
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from history import DEFAULT_END, DEFAULT_START, iter_history
+import instrumentation
+import jobs
+import pipeline
+import result_cache
+
+
+# Uploads larger than this are spooled to disk while they stream in
+SPOOL_BYTES = 8 * 1024 * 1024
+
+scheduler = jobs.JobScheduler()
+startup = {}
+
+
+def _warm_up():
+    startup.update(pipeline.warm_up(figures=True))
+    jobs.start_pool()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Step modules, plotly and worker processes are ready before requests
+    await run_in_threadpool(_warm_up)
+    yield
+
+
+app = FastAPI(title="YouTube Watch History Analysis", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    """Liveness plus the import / warm-up timings of this process."""
+    return {"status": "ok", "startup": startup}
+
+
+def _read_history(fp, start, end):
+    fp.seek(0)
+    try:
+        return list(iter_history(fp, start, end))
+    finally:
+        fp.close()
+
+
+def _analyze(history, start, end, run_key, profile, progress):
+    _, stats = jobs.run_in_process(
+        pipeline.run_job, history, start, end, run_key, profile=profile, progress=progress
+    )
+    return stats
+
+
+def _result(key):
+    final_df = result_cache.get(key)
+    if final_df is None:
+        raise HTTPException(404, "Unknown or evicted result; submit the file again.")
+    return final_df
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+    profile: Optional[str] = None,
+):
+    """Analyze the watch-history.json sent as the request body.
+
+    profile=cprofile (or pyinstrument, if installed) profiles the run; the
+    job's stats then include the profile summary and the per-step report.
+    """
+    if profile is not None and profile not in instrumentation.PROFILERS:
+        raise HTTPException(
+            422, f"profile must be one of: {', '.join(instrumentation.PROFILERS)}"
+        )
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    async for chunk in request.stream():
+        digest.update(chunk)
+        await run_in_threadpool(spool.write, chunk)
+
+    # Same key as the app uses for the same file and window
+    run_key = result_cache.cache_key(digest.hexdigest(), start=start, end=end)
+    if profile is None:
+        if result_cache.exists(run_key):
+            spool.close()
+            return {"id": None, "state": jobs.DONE, "result": run_key}
+        # The same upload is already being analyzed: poll that job instead
+        running = scheduler.find(run_key)
+        if running is not None:
+            spool.close()
+            return {"id": running.id, "state": running.state, "result": None}
+
+    try:
+        history = await run_in_threadpool(_read_history, spool, start, end)
+    except ValueError as e:
+        raise HTTPException(400, f"Not a watch-history.json file: {e}")
+    if not history:
+        raise HTTPException(
+            422, f"Your json file didn't have data between {start} and {end}."
+        )
+
+    job = scheduler.submit(
+        partial(_analyze, history, start, end, run_key, profile), key=run_key
+    )
+    return {"id": job.id, "state": job.state, "result": None}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+
+    percent, message = job.progress
+    status = {
+        "id": job.id,
+        "state": job.state,
+        "progress": {"percent": percent, "message": message},
+        "position": scheduler.position(job),
+        "estimated_wait": round(scheduler.estimated_wait(job), 1),
+        "result": job.key if job.state == jobs.DONE else None,
+    }
+    if job.state == jobs.DONE:
+        status["stats"] = job.result
+    elif job.state == jobs.FAILED:
+        status["error"] = str(job.error)
+    return status
+
+
+@app.delete("/jobs/{job_id}", status_code=204)
+def cancel_job(job_id: str):
+    if scheduler.get(job_id) is None:
+        raise HTTPException(404, "Unknown job")
+    scheduler.cancel(job_id)
+
+
+@app.get("/results/{key}/kpis")
+def result_kpis(key: str):
+    return pipeline.compute_kpis(_result(key))
+
+
+@app.get("/results/{key}/figures")
+def result_figures(key: str):
+    figs = pipeline.build_plotly_figures(_result(key))
+    # Already-serialized JSON, passed through without re-encoding
+    body = "{" + ",".join(f'"{name}":{fig.to_json()}' for name, fig in figs.items()) + "}"
+    return Response(body, media_type="application/json")
+
+
+@app.get("/results/{key}/export.csv")
+def export_csv(key: str):
+    return Response(
+        pipeline.dataframes_to_csv_bytes(_result(key)),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="watch-history.csv"'},
+    )
+
+
+@app.get("/results/{key}/export.parquet")
+def export_parquet(key: str):
+    buf = io.BytesIO()
+    _result(key).to_parquet(buf, index=False, compression="zstd")
+    return Response(
+        buf.getvalue(),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": 'attachment; filename="watch-history.parquet"'},
+    )
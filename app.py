@@ -1,21 +1,62 @@
 import streamlit as st
-import json
 import pandas as pd
-import time
 import uuid
-import threading
-from pipeline import load_step
-import visualizations
+import instrumentation
+import jobs
+import pipeline
+import result_cache
+from history import DEFAULT_END, DEFAULT_START, HistoryIndex
 import streamlit.components.v1 as components
 
 
-# Queue Management
+# Analysis jobs are shared by all sessions of this process
 @st.cache_resource
-def get_queue():
-    return {"queue": [], "lock": threading.Lock()}
+def get_scheduler():
+    return jobs.JobScheduler()
 
 
-queue_state = get_queue()
+scheduler = get_scheduler()
+
+
+# Runs once per server process, after the landing page has been sent
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    report = pipeline.warm_up(figures=True)
+    jobs.start_pool()
+    return report
+
+
+# Figures are memoized as JSON per result and window length, so reruns and
+# other sessions viewing the same result skip building them
+@st.cache_data(max_entries=256, show_spinner=False)
+def figure_json(run_key, name, days, _cube):
+    # plotly is imported on first use, not at app start
+    import visualizations
+
+    return visualizations.build_figure(_cube, name, days).to_json()
+
+
+def show_figure(name):
+    import plotly.io as pio
+
+    cube_state = st.session_state["dashboard"]
+    fig = pio.from_json(
+        figure_json(
+            cube_state["run_key"], name, cube_state["days"], cube_state["cube"]
+        )
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+# Each section reruns on its own instead of redrawing the whole dashboard
+@st.fragment
+def show_section(*names):
+    if len(names) == 1:
+        show_figure(names[0])
+        return
+    for col, name in zip(st.columns(len(names)), names):
+        with col:
+            show_figure(name)
 
 # Page Config
 st.set_page_config(
@@ -79,6 +120,37 @@ st.markdown(
 
 uploaded_file = st.file_uploader("Upload watch-history.json", type="json")
 
+window = st.sidebar.date_input(
+    "Analysis window (UTC)", value=(DEFAULT_START, DEFAULT_END)
+)
+
+show_diagnostics = st.sidebar.toggle("Diagnostics")
+profiler = None
+if show_diagnostics:
+    profiler = st.sidebar.selectbox(
+        "Profile the next analysis", [None, *instrumentation.PROFILERS],
+        format_func=lambda kind: kind or "off",
+    )
+
+
+def show_diagnostics_panel():
+    """Step timings of the upload parse, the last analysis and the dashboard."""
+    diagnostics = st.session_state.get("diagnostics", {})
+    rows = [
+        {"source": source, **record}
+        for source in ("app", "pipeline")
+        for record in diagnostics.get(source, [])
+    ]
+    with st.expander("Diagnostics", expanded=True):
+        if not rows:
+            st.text("No steps recorded yet (the result came from the cache).")
+            return
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        profile = diagnostics.get("profile")
+        if profile:
+            st.caption(f"{profile['kind']} profile saved to {profile['path']}")
+            st.text(profile["summary"])
+
 if uploaded_file is None:
     st.markdown(
         """
@@ -97,18 +169,69 @@ if uploaded_file is None:
     )
 
 
+warm_up()
+
 if uploaded_file is not None:
     try:
+        if len(window) != 2:
+            st.info("Pick the end date of the analysis window in the sidebar.")
+            st.stop()
+        start, end = window
+
+        # Uploads are identified by content, not by file name
+        if st.session_state.get("upload_id") != uploaded_file.file_id:
+            st.session_state["upload_id"] = uploaded_file.file_id
+            st.session_state["upload_hash"] = result_cache.content_hash(
+                uploaded_file.getvalue()
+            )
+        upload_hash = st.session_state["upload_hash"]
+
+        # Parse once per file; the month index serves any analysis window
+        if st.session_state.get("index_hash") != upload_hash:
+            parse_stats = {}
+            with st.spinner("File uploaded. Parsing JSON..."), instrumentation.step(
+                parse_stats, "parse_upload"
+            ) as record:
+                uploaded_file.seek(0)
+                st.session_state["history_index"] = HistoryIndex.from_file(
+                    uploaded_file
+                )
+                st.session_state["index_hash"] = upload_hash
+                record["rows_out"] = sum(
+                    map(len, st.session_state["history_index"].partitions.values())
+                )
+            st.session_state["diagnostics"] = {"app": parse_stats["steps"]}
+
+        history_index = st.session_state["history_index"]
+        date_range = history_index.date_range()
+        if date_range:
+            st.sidebar.caption(f"Your history covers {date_range[0]} to {date_range[1]}.")
+
+        run_key = result_cache.cache_key(upload_hash, start=start, end=end)
+
+        # Results are shared across sessions and restarts by content hash
+        if st.session_state.get("run_key") != run_key:
+            cached = result_cache.get(run_key)
+            if cached is not None:
+                st.session_state["processed_data"] = cached
+                st.session_state["run_key"] = run_key
+                st.session_state["from_cache"] = True
+
         # Check if data is already processed in session state for this file
         if (
             "processed_data" not in st.session_state
-            or st.session_state.get("file_name") != uploaded_file.name
+            or st.session_state.get("run_key") != run_key
         ):
-            # Read JSON immediately to confirm upload
+            app_stats = {}
+            with instrumentation.step(app_stats, "select_window") as record:
+                data = history_index.select(start, end)
+                record["rows_out"] = len(data)
+            if not data:
+                st.error(f"Your json file didn't have data between {start} and {end}.")
+                st.stop()
+
             upload_status = st.empty()
             with upload_status.container():
-                st.text("File uploaded. Parsing JSON...")
-                data = json.load(uploaded_file)
                 st.text("JSON parsed. Waiting for analysis slot...")
 
             # ---------------- QUEUE LOGIC ----------------
@@ -117,103 +240,90 @@ if uploaded_file is not None:
 
             req_id = st.session_state["request_id"]
 
-            # Add to queue if not present
-            with queue_state["lock"]:
-                if req_id not in queue_state["queue"]:
-                    queue_state["queue"].append(req_id)
+            def analyze(progress):
+                # Run Pipeline in a worker process (reuses a stored analysis
+                # of an older export and stores the result in the cache, so
+                # it survives the session going away)
+                payload, fetch_stats = jobs.run_in_process(
+                    pipeline.run_job,
+                    data,
+                    start,
+                    end,
+                    run_key,
+                    profile=profiler,
+                    progress=progress,
+                )
+                return pipeline.frame_from_bytes(payload), fetch_stats
 
-            queue_placeholder = st.empty()
+            # A rerun of this session finds its job still queued or running
+            job = scheduler.submit(analyze, owner=req_id, key=run_key)
 
-            try:
-                while True:
-                    with queue_state["lock"]:
-                        try:
-                            position = queue_state["queue"].index(req_id)
-                        except ValueError:
-                            queue_state["queue"].append(req_id)
-                            position = len(queue_state["queue"]) - 1
-
-                    if position == 0:
-                        queue_placeholder.empty()
-                        break
-                    else:
-                        queue_placeholder.warning(
-                            f"⚠️ Analysis server busy. JSON loaded. You are in queue position {position} for processing."
-                        )
-                        time.sleep(2)
-
-                upload_status.text("Starting analysis...")
-                # Load Steps dynamically using the existing pipeline helper
-                step1 = load_step("step1", "1_yt_vid_metadata.py")
-
-                step2 = load_step("step2", "2_merged_data.py")
-                step3 = load_step("step3", "3_deduplicate.py")
-                step4 = load_step("step4", "4_remove_live.py")
-                step5 = load_step("step5", "5_remove_unavailable.py")
-                step6 = load_step("step6", "6_remove_videos.py")
-                step7 = load_step("step7", "7_to_the_hour.py")
-                step8 = load_step("step8", "8_the_finishing.py")
-
-                # Progress Bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                # Run Pipeline
-                status_text.text(
-                    "[1/8] Fetching metadata and filtering watch history (2025)..."
+            queue_placeholder = st.empty()
+            progress_bar = None
+            version = None
+            while not job.finished:
+                version = scheduler.wait(job, since=version)
+                if job.state == jobs.QUEUED:
+                    position = scheduler.position(job)
+                    wait = scheduler.estimated_wait(job)
+                    queue_placeholder.warning(
+                        f"⚠️ Analysis server busy. JSON loaded. You are in queue position {position} for processing "
+                        f"(about {wait:.0f}s)."
+                    )
+                    continue
+
+                if progress_bar is None:
+                    queue_placeholder.empty()
+                    upload_status.text("Starting analysis...")
+
+                    # Progress Bar
+                    progress_bar = st.progress(0)
+                    status_text = st.empty()
+
+                percent, message = job.progress
+                progress_bar.progress(percent)
+                status_text.text(message)
+
+            scheduler.release(job)
+            if job.state == jobs.FAILED:
+                raise job.error
+            if job.state == jobs.CANCELLED:
+                st.warning("The analysis was cancelled. Reload the page to try again.")
+                st.stop()
+
+            df, fetch_stats = job.result
+            app_stats["steps"] += [
+                {"step": "queue_wait", "wall_s": round(job.started_at - job.submitted_at, 4)},
+                {
+                    "step": "analysis_job",
+                    "rows_in": len(data),
+                    "rows_out": len(df),
+                    "wall_s": round(job.finished_at - job.started_at, 4),
+                },
+            ]
+            instrumentation.emit(app_stats, entry_point="app")
+            diagnostics = st.session_state.setdefault("diagnostics", {})
+            diagnostics["app"] = [
+                r for r in diagnostics.get("app", []) if r["step"] == "parse_upload"
+            ] + app_stats["steps"]
+            diagnostics["pipeline"] = fetch_stats.get("steps", [])
+            diagnostics["profile"] = fetch_stats.get("profile")
+            if fetch_stats.get("incremental"):
+                st.caption(
+                    f"Reused a previous analysis; processed "
+                    f"{fetch_stats['delta_entries']} new entries."
                 )
-                progress_bar.progress(40)
-                history_2025, cache_list = step1.run(data)
-
-                if not history_2025:
-                    status_text.empty()
-                    progress_bar.empty()
-                    st.error("Your json file didn't have 2025 data.")
-                    # Handle queue removal before stopping
-                    with queue_state["lock"]:
-                        if req_id in queue_state["queue"]:
-                            queue_state["queue"].remove(req_id)
-                    st.stop()
-
-                progress_bar.progress(50)
-
-                status_text.text("[2/8] Merging watch history with metadata...")
-                df = step2.run(history_2025, cache_list)
-                progress_bar.progress(57)
-
-                status_text.text("[3/8] Deduplicating non-music videos...")
-                df = step3.run(df)
-                progress_bar.progress(64)
-
-                status_text.text("[4/8] Removing live streams...")
-                df = step4.run(df)
-                progress_bar.progress(71)
-
-                status_text.text("[5/8] Removing unavailable/deleted videos...")
-                df = step5.run(df)
-                progress_bar.progress(78)
-
-                status_text.text("[6/8] Capping long videos and sorting...")
-                df = step6.run(df)
-                progress_bar.progress(85)
-
-                status_text.text("[7/8] Flooring timestamps...")
-                df = step7.run(df)
-                progress_bar.progress(92)
-
-                status_text.text("[8/8] Finishing touches...")
-                df = step8.run(df)
-                progress_bar.progress(100)
-
-                status_text.text("Processing complete!")
-            finally:
-                with queue_state["lock"]:
-                    if req_id in queue_state["queue"]:
-                        queue_state["queue"].remove(req_id)
+            st.caption(
+                f"Metadata cache: {fetch_stats.get('cache_hits', 0)} hits, "
+                f"{fetch_stats.get('cache_misses', 0)} fetched from the API, "
+                f"{fetch_stats.get('known_unavailable', 0)} skipped as deleted/private. "
+                f"Result size: {fetch_stats['memory_bytes']['total'] / 1e6:.1f} MB."
+            )
 
             # Store in session state
             st.session_state["processed_data"] = df
-            st.session_state["file_name"] = uploaded_file.name
+            st.session_state["run_key"] = run_key
+            st.session_state["from_cache"] = False
 
         else:
             df = st.session_state["processed_data"]
@@ -223,28 +333,33 @@ if uploaded_file is not None:
         st.divider()
         st.subheader("Dashboard")
 
-        figs = visualizations.create_charts(df)
-
-        # Display charts
-
-        # KPI
-        st.plotly_chart(figs["kpi"], use_container_width=True)
-
-        # Mixed (Donut + Treemap)
-        st.plotly_chart(figs["mixed"], use_container_width=True)
-
-        # Trend
-        st.plotly_chart(figs["trend"], use_container_width=True)
+        # Aggregated once per result; reruns only redraw from the cube
+        if st.session_state.get("cube_key") != run_key:
+            import visualizations
+
+            cube_stats = {}
+            with instrumentation.step(cube_stats, "build_cube", rows_in=len(df)):
+                st.session_state["chart_cube"] = visualizations.build_cube(df)
+            st.session_state["cube_key"] = run_key
+            st.session_state.setdefault("diagnostics", {}).setdefault("app", []).extend(
+                cube_stats["steps"]
+            )
+
+        st.session_state["dashboard"] = {
+            "run_key": run_key,
+            "days": (end - start).days + 1,
+            "cube": st.session_state["chart_cube"],
+        }
 
-        # Middle section: Channels
-        st.plotly_chart(figs["channels"], use_container_width=True)
+        # KPI, mixed (Donut + Treemap), trend, channels, then hour and DOW
+        show_section("kpi")
+        show_section("mixed")
+        show_section("trend")
+        show_section("channels")
+        show_section("hour", "dow")
 
-        # Bottom section: Hour and DOW
-        col1, col2 = st.columns(2)
-        with col1:
-            st.plotly_chart(figs["hour"], use_container_width=True)
-        with col2:
-            st.plotly_chart(figs["dow"], use_container_width=True)
+        if show_diagnostics:
+            show_diagnostics_panel()
 
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
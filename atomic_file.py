@@ -0,0 +1,24 @@
+"""
+Atomic file replacement for the state, cache and cassette files.
+"""
+
+import os
+import tempfile
+
+
+def atomic_write(path, write):
+    """
+    Call write(tmp_path) on a temporary file next to `path`, then move it
+    over `path`; readers never see a partial file. The temporary file is
+    removed if writing fails.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,118 @@
+"""
+Local stand-in for the YouTube Data API videos.list endpoint.
+
+Serves Catalog metadata over HTTP with tunable latency and quota errors, so
+the real fetch path (session pool, key scheduler, retries) runs offline.
+Point the pipeline at it with YT_VIDEOS_URL=<StubServer.url>.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import collections
+import json
+import random
+import threading
+import time
+
+
+QUOTA_ERROR = {
+    "error": {
+        "code": 403,
+        "message": "The request cannot be completed because you have exceeded your quota.",
+        "errors": [{"reason": "quotaExceeded", "domain": "youtube.quota"}],
+    }
+}
+RATE_ERROR = {
+    "error": {
+        "code": 429,
+        "message": "Too many requests.",
+        "errors": [{"reason": "rateLimitExceeded", "domain": "youtube.quota"}],
+    }
+}
+
+
+class StubServer:
+    """
+    `latency` (+ up to `jitter`) seconds per request; after `quota_per_key`
+    requests a key gets 403 quotaExceeded; `error_rate` of requests get 429.
+    """
+
+    def __init__(
+        self, catalog, latency=0.0, jitter=0.0, quota_per_key=None, error_rate=0.0, seed=0
+    ):
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_key = quota_per_key
+        self.error_rate = error_rate
+        self.calls = 0
+        self.ids_requested = 0
+        self.errors = collections.Counter()
+        self.per_key = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/youtube/v3/videos"
+
+    def respond(self, query):
+        """(status, payload) for one videos.list query."""
+        ids = [i for i in query.get("id", [""])[0].split(",") if i]
+        key = query.get("key", [""])[0]
+        with self._lock:
+            self.calls += 1
+            self.ids_requested += len(ids)
+            self.per_key[key] += 1
+            over_quota = self.quota_per_key is not None and self.per_key[key] > self.quota_per_key
+            rate_limited = self._random.random() < self.error_rate
+            delay = self.latency + self._random.random() * self.jitter
+            if over_quota:
+                self.errors[403] += 1
+            elif rate_limited:
+                self.errors[429] += 1
+
+        if delay:
+            time.sleep(delay)
+        if over_quota:
+            return 403, QUOTA_ERROR
+        if rate_limited:
+            return 429, RATE_ERROR
+        items = [item for item in map(self.catalog.item, ids) if item is not None]
+        return 200, {"kind": "youtube#videoListResponse", "items": items}
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, payload = stub.respond(parse_qs(urlparse(self.path).query))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
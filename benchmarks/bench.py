@@ -0,0 +1,270 @@
+"""
+Pipeline benchmark: wall time, CPU time, peak RSS and API calls per step.
+
+Each history size runs in a fresh process against a local API stub, with its
+own empty metadata cache, so the numbers are comparable across runs:
+
+    python benchmarks/bench.py --entries 10000 100000 --latency 0.05
+    python benchmarks/bench.py --entries 1000000 --years 2020 2021 2022 2023 2024 2025 --out bench.jsonl
+
+Measured: parsing the file, step 1 against the stub (cold metadata cache),
+step 2, steps 3-8 one by one, the fused cleaning engine, a full warm
+run_pipeline, and build_cube + create_charts for the dashboard. The fused
+engine's output is checked against the chained steps; a mismatch is
+recorded as an error with its traceback.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(HERE))
+
+from api_stub import StubServer  # noqa: E402
+from takeout import add_catalog_args, catalog_from_args, generate, write  # noqa: E402
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+def peak_rss():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Peak RSS while a block runs, sampled every `interval` seconds."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    def __enter__(self):
+        self.start = current_rss()
+        self.peak = self.start or 0
+        self._stop = threading.Event()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.start is None:
+            # Process-wide peak only
+            self.peak = peak_rss()
+            self.end = None
+        else:
+            self._thread.join()
+            self.end = current_rss()
+            self.peak = max(self.peak, self.end)
+
+
+def _rows(value):
+    if hasattr(value, "__len__") and not isinstance(value, tuple):
+        return len(value)
+    if isinstance(value, tuple):
+        return len(value[0])
+    return None
+
+
+def run_case(entries, args):
+    """Benchmark one history size; runs in its own process."""
+    tmp = Path(tempfile.mkdtemp(prefix="ywh-bench-"))
+    catalog = catalog_from_args(args)
+    stub = StubServer(
+        catalog,
+        latency=args.latency,
+        jitter=args.jitter,
+        quota_per_key=args.quota_per_key,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ).start()
+
+    os.environ.update(
+        {
+            "YT_VIDEOS_URL": stub.url,
+            "YT_KEY_STATE_FILE": str(tmp / "keys.json"),
+            "YT_KEY_DAILY_QUOTA": str(10**9),
+            "YT_KEY_MAX_QPS": str(args.max_qps),
+            "YWH_METADATA_DB": str(tmp / "metadata.sqlite3"),
+            "YWH_INCREMENTAL": "0",
+            "YWH_RESULT_CACHE_BYTES": "0",
+            "YWH_RESULT_CACHE_DIR": str(tmp / "results"),
+            "YWH_STATE_DIR": str(tmp / "state"),
+        }
+    )
+    for i in range(1, args.keys + 1):
+        os.environ[f"YT_API_{i}"] = f"bench-key-{i}"
+    sys.path.insert(0, str(ROOT))
+    os.chdir(tmp)
+
+    records = []
+
+    def measure(step, fn, *fn_args, **fn_kwargs):
+        calls_before = stub.calls
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        try:
+            with RssSampler() as rss:
+                result = fn(*fn_args, **fn_kwargs)
+        except Exception as e:
+            # e.g. every key exhausted by --quota-per-key
+            records.append({"entries": entries, "step": step, "error": repr(e)})
+            raise
+        record = {
+            "entries": entries,
+            "step": step,
+            "wall_s": round(time.perf_counter() - wall, 4),
+            "cpu_s": round(time.process_time() - cpu, 4),
+            "peak_rss_mb": round(rss.peak / 2**20, 1),
+            "rss_delta_mb": (
+                round((rss.end - rss.start) / 2**20, 1) if rss.end is not None else None
+            ),
+            "rows_out": _rows(result),
+            "api_calls": stub.calls - calls_before,
+        }
+        records.append(record)
+        return result
+
+    try:
+        _run_steps(entries, args, catalog, tmp, measure, records)
+    except Exception as e:
+        # Failures inside measure() have recorded their step already
+        if not (records and "error" in records[-1]):
+            records.append({"entries": entries, "step": "run", "error": repr(e)})
+        records[-1]["traceback"] = traceback.format_exc()
+    records.append(
+        {
+            "entries": entries,
+            "step": "total",
+            "peak_rss_mb": round(peak_rss() / 2**20, 1),
+            "api_calls": stub.calls,
+            "ids_requested": stub.ids_requested,
+            "api_errors": dict(stub.errors),
+        }
+    )
+    stub.stop()
+    return records
+
+
+def _run_steps(entries, args, catalog, tmp, measure, records):
+    path = tmp / "watch-history.json"
+    measure(
+        "generate",
+        write,
+        path,
+        generate(entries, catalog, args.years, args.rewatch_rate, args.seed),
+    )
+    records[-1]["file_mb"] = round(path.stat().st_size / 2**20, 1)
+
+    import_started = time.perf_counter()
+    import pandas as pd
+    import pipeline
+    import visualizations
+    from history import iter_history
+
+    records.append(
+        {"entries": entries, "step": "import", "wall_s": round(time.perf_counter() - import_started, 4)}
+    )
+
+    def parse():
+        with open(path, "rb") as f:
+            return list(iter_history(f))
+
+    history = measure("parse", parse)
+
+    stats = {}
+    step1 = pipeline.load_step("step1", "1_yt_vid_metadata.py")
+    history_window, metadata = measure(
+        "step1 (cold cache)", step1.run, history, stats=stats, start=None, end=None
+    )
+    records[-1]["api_requests"] = stats.get("api_requests", 0)
+    records[-1]["bytes_received"] = stats.get("bytes_received", 0)
+
+    step2 = pipeline.load_step("step2", "2_merged_data.py")
+    merged = measure("step2", step2.run, history_window, metadata)
+
+    df = merged
+    for module_name, filename in pipeline.CLEANING_STEPS:
+        df = measure(module_name, pipeline.load_step(module_name, filename).run, df)
+    fused = measure("clean_fused", pipeline.clean_fused, merged)
+    # The fused engine must reproduce steps 3-8 exactly
+    pd.testing.assert_frame_equal(fused, df)
+
+    final_df = measure(
+        "run_pipeline (warm cache)", pipeline.run_pipeline, history, start=None, end=None
+    )
+    cube = measure("build_cube", visualizations.build_cube, final_df)
+    measure("create_charts", visualizations.create_charts, cube)
+
+
+def print_table(records):
+    columns = ["entries", "step", "wall_s", "cpu_s", "peak_rss_mb", "rss_delta_mb", "rows_out", "api_calls", "error"]
+    print("  ".join(f"{c:>26}" if c == "step" else f"{c:>12}" for c in columns))
+    for r in records:
+        print(
+            "  ".join(
+                f"{str(r.get(c, '')):>26}" if c == "step" else f"{str(r.get(c, '')):>12}"
+                for c in columns
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    add_catalog_args(parser)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency")
+    parser.add_argument("--quota-per-key", type=int, default=None, help="calls before 403")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 429s")
+    parser.add_argument("--keys", type=int, default=3)
+    parser.add_argument("--max-qps", type=float, default=1000, help="YT_KEY_MAX_QPS")
+    parser.add_argument("--out", help="append records to this JSON lines file")
+    args = parser.parse_args()
+
+    all_records = []
+    ctx = multiprocessing.get_context("spawn")
+    for entries in args.entries:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            records = pool.submit(run_case, entries, args).result()
+        print_table(records)
+        for r in records:
+            if "traceback" in r:
+                print(r["traceback"], file=sys.stderr)
+        print(json.dumps(records[-1]))
+        all_records.extend(records)
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for r in all_records:
+                f.write(json.dumps(r) + "\n")
+
+
+if __name__ == "__main__":
+    main()
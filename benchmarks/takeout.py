@@ -0,0 +1,189 @@
+"""
+Synthetic Google Takeout watch history and the video catalog behind it.
+
+Every property of a video (title, channel, category, duration, deleted or
+not) is derived from a hash of its id, so the history generator and the API
+stub agree without sharing any state.
+
+    python benchmarks/takeout.py 100000 -o watch-history.json --years 2024 2025
+"""
+
+from datetime import datetime, timedelta, timezone
+import argparse
+import base64
+import hashlib
+import json
+import random
+
+
+MUSIC_WORDS = ["Official Video", "Lyrics", "Audio", "Remix", "Live Session"]
+TOPIC_WORDS = ["Tutorial", "Review", "Vlog", "Highlights", "Explained", "Podcast"]
+
+
+def _unit(digest, i):
+    # i-th uniform float in [0, 1) from a 32-byte digest
+    return int.from_bytes(digest[4 * i : 4 * i + 4], "little") / 2**32
+
+
+class Catalog:
+    """Deterministic videos.list metadata for any video id."""
+
+    def __init__(
+        self,
+        seed=0,
+        music_share=0.3,
+        live_share=0.02,
+        shorts_share=0.15,
+        deleted_rate=0.05,
+        channels=2000,
+    ):
+        self.seed = seed
+        self.music_share = music_share
+        self.live_share = live_share
+        self.shorts_share = shorts_share
+        self.deleted_rate = deleted_rate
+        self.channels = channels
+
+    def video_id(self, i):
+        """11-character id of the i-th video."""
+        digest = hashlib.blake2b(f"{self.seed}:{i}".encode(), digest_size=9).digest()
+        return base64.urlsafe_b64encode(digest).decode()[:11]
+
+    def _digest(self, video_id):
+        return hashlib.blake2b(
+            f"{self.seed}/{video_id}".encode(), digest_size=32
+        ).digest()
+
+    def describe(self, video_id):
+        """Plain attributes of a video; None when it is deleted or private."""
+        d = self._digest(video_id)
+        if _unit(d, 0) < self.deleted_rate:
+            return None
+
+        kind = _unit(d, 1)
+        channel = f"Channel {int(_unit(d, 2) * self.channels)}"
+        number = int(_unit(d, 3) * 10_000)
+        if kind < self.music_share:
+            title = f"Song {number} ({MUSIC_WORDS[number % len(MUSIC_WORDS)]})"
+            category, duration = "10", 120 + int(_unit(d, 4) * 240)
+        elif kind < self.music_share + self.live_share:
+            title = f"LIVE stream {number}"
+            category, duration = "20", 3600 + int(_unit(d, 4) * 4 * 3600)
+        elif kind < self.music_share + self.live_share + self.shorts_share:
+            title = f"Short {number} #shorts"
+            category, duration = "22", 5 + int(_unit(d, 4) * 55)
+        else:
+            title = f"{TOPIC_WORDS[number % len(TOPIC_WORDS)]} {number}"
+            category = ["22", "24", "27", "28"][number % 4]
+            duration = 180 + int(_unit(d, 4) ** 2 * 3 * 3600)
+
+        published = datetime(2015, 1, 1, tzinfo=timezone.utc) + timedelta(
+            seconds=int(_unit(d, 5) * 10 * 365 * 86400)
+        )
+        return {
+            "title": title,
+            "channel": channel,
+            "category": category,
+            "duration": duration,
+            "published": published,
+            "views": int(_unit(d, 6) ** 3 * 50_000_000),
+            "likes": int(_unit(d, 7) ** 3 * 500_000),
+        }
+
+    def item(self, video_id):
+        """The videos.list item for `video_id`, or None if it is not returned."""
+        v = self.describe(video_id)
+        if v is None:
+            return None
+        h, rest = divmod(v["duration"], 3600)
+        m, s = divmod(rest, 60)
+        return {
+            "id": video_id,
+            "snippet": {
+                "title": v["title"],
+                "channelTitle": v["channel"],
+                "publishedAt": v["published"].strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "categoryId": v["category"],
+            },
+            "contentDetails": {"duration": f"PT{h}H{m}M{s}S"},
+            "statistics": {"viewCount": str(v["views"]), "likeCount": str(v["likes"])},
+        }
+
+
+def generate(n, catalog, years=(2025,), rewatch_rate=0.3, seed=0):
+    """
+    Yield `n` Takeout watch entries, newest first, spread uniformly over
+    `years`. A `rewatch_rate` share of entries repeats an earlier video.
+    """
+    rnd = random.Random(seed)
+    first = datetime(min(years), 1, 1, tzinfo=timezone.utc)
+    span = int((datetime(max(years) + 1, 1, 1, tzinfo=timezone.utc) - first).total_seconds())
+    offsets = sorted((rnd.randrange(span * 1000) for _ in range(n)), reverse=True)
+
+    watched = []
+    for offset in offsets:
+        if watched and rnd.random() < rewatch_rate:
+            video_id = rnd.choice(watched)
+        else:
+            video_id = catalog.video_id(len(watched))
+            watched.append(video_id)
+
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        t = first + timedelta(milliseconds=offset)
+        entry = {
+            "header": "YouTube",
+            "title": f"Watched {url}",
+            "titleUrl": url,
+            "time": t.strftime("%Y-%m-%dT%H:%M:%S.") + f"{t.microsecond // 1000:03d}Z",
+            "products": ["YouTube"],
+            "activityControls": ["YouTube watch history"],
+        }
+        v = catalog.describe(video_id)
+        if v is not None:
+            entry["title"] = f"Watched {v['title']}"
+            entry["subtitles"] = [{"name": v["channel"], "url": "https://www.youtube.com/channel/x"}]
+            if v["category"] == "10":
+                entry["header"] = "YouTube Music"
+        yield entry
+
+
+def write(path, entries):
+    """Stream entries to `path` as a Takeout-style JSON array."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, entry in enumerate(entries):
+            f.write(",\n" if i else "\n")
+            json.dump(entry, f, ensure_ascii=False)
+        f.write("\n]\n")
+
+
+def add_catalog_args(parser):
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--years", type=int, nargs="+", default=[2025])
+    parser.add_argument("--rewatch-rate", type=float, default=0.3)
+    parser.add_argument("--music-share", type=float, default=0.3)
+    parser.add_argument("--live-share", type=float, default=0.02)
+    parser.add_argument("--shorts-share", type=float, default=0.15)
+    parser.add_argument("--deleted-rate", type=float, default=0.05)
+
+
+def catalog_from_args(args):
+    return Catalog(
+        seed=args.seed,
+        music_share=args.music_share,
+        live_share=args.live_share,
+        shorts_share=args.shorts_share,
+        deleted_rate=args.deleted_rate,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("entries", type=int)
+    parser.add_argument("-o", "--output", default="watch-history.json")
+    add_catalog_args(parser)
+    args = parser.parse_args()
+    entries = generate(
+        args.entries, catalog_from_args(args), args.years, args.rewatch_rate, args.seed
+    )
+    write(args.output, entries)
@@ -0,0 +1,179 @@
+"""
+Incremental reader for the Takeout watch-history.json array.
+
+Entries are decoded one at a time and filtered as they are read, so memory
+stays proportional to the kept rows rather than the whole export.
+"""
+
+from datetime import date
+import codecs
+import json
+
+
+CHUNK_SIZE = 1 << 16
+
+# The only entry fields the pipeline reads
+KEPT_FIELDS = ("title", "titleUrl", "time")
+
+# Analysis window used when none is given (dates are inclusive, UTC)
+DEFAULT_START = date(2025, 1, 1)
+DEFAULT_END = date(2025, 12, 31)
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(fp, chunk_size=CHUNK_SIZE):
+    """
+    Yield the elements of a top-level JSON array read from a binary or text
+    file object (or bytes/str), without materializing the whole list.
+    """
+    if isinstance(fp, (bytes, str)):
+        data, fp = fp, None
+    else:
+        data = None
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def read_more():
+        nonlocal buf, pos, eof, data
+        if fp is None:
+            chunk, data = data, None
+        else:
+            chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            buf = buf[pos:] + utf8.decode(chunk)
+        else:
+            buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buf) and (
+            buf[pos] in _WHITESPACE or (started and buf[pos] == ",")
+        ):
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("watch-history JSON ended before the list was closed")
+            read_more()
+            continue
+
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("watch-history JSON must be a list")
+            started = True
+            pos += 1
+            continue
+
+        if buf[pos] == "]":
+            return
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            read_more()
+            continue
+
+        # A value touching the end of the buffer may have been cut short
+        if end >= len(buf) and not eof:
+            read_more()
+            continue
+
+        pos = end
+        yield value
+
+
+def _bounds(start, end):
+    return (
+        start.isoformat() if start is not None else "",
+        end.isoformat() if end is not None else "9999-12-31",
+    )
+
+
+def in_window(raw_time, start=None, end=None):
+    """
+    Whether an ISO-8601 timestamp's (UTC) date lies in [start, end], inclusive.
+    None leaves that side of the window open.
+    """
+    lo, hi = _bounds(start, end)
+    day = (raw_time or "")[:10]
+    return len(day) == 10 and lo <= day <= hi
+
+
+def iter_history(fp, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield slim watch entries (title, titleUrl, time) for `watch?v=` URLs
+    watched between the `start` and `end` dates (inclusive, None = open).
+    """
+    lo, hi = _bounds(start, end)
+
+    for entry in iter_json_array(fp, chunk_size):
+        if not isinstance(entry, dict):
+            continue
+        if "watch?v=" not in entry.get("titleUrl", ""):
+            continue
+        day = (entry.get("time") or "")[:10]
+        if len(day) != 10 or not lo <= day <= hi:
+            continue
+        yield {field: entry[field] for field in KEPT_FIELDS if field in entry}
+
+
+class HistoryIndex:
+    """
+    Slim watch entries partitioned by UTC month ("YYYY-MM").
+
+    Built once per upload; changing the analysis window only touches the
+    partitions it overlaps instead of re-reading the raw JSON.
+    """
+
+    def __init__(self, entries=()):
+        self.partitions = {}
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_file(cls, fp, chunk_size=CHUNK_SIZE):
+        return cls(iter_history(fp, chunk_size=chunk_size))
+
+    def add(self, entry):
+        self.partitions.setdefault(entry["time"][:7], []).append(entry)
+
+    def __len__(self):
+        return sum(len(part) for part in self.partitions.values())
+
+    def months(self):
+        return sorted(self.partitions)
+
+    def date_range(self):
+        """(first, last) watch date, or None when empty."""
+        if not self.partitions:
+            return None
+        months = self.months()
+        first = min(e["time"][:10] for e in self.partitions[months[0]])
+        last = max(e["time"][:10] for e in self.partitions[months[-1]])
+        return date.fromisoformat(first), date.fromisoformat(last)
+
+    def select(self, start=None, end=None):
+        """
+        Entries watched in [start, end], in file order within each month.
+        """
+        lo, hi = _bounds(start, end)
+        selected = []
+        # Partitions keep file order (newest month first for Takeout exports)
+        for month, part in self.partitions.items():
+            if not lo[:7] <= month <= hi[:7]:
+                continue
+            if lo <= month + "-01" and month + "-31" <= hi:
+                selected.extend(part)
+            else:
+                selected.extend(e for e in part if lo <= e["time"][:10] <= hi)
+        return selected
@@ -0,0 +1,130 @@
+"""
+Stored analysis state for incremental re-analysis of newer Takeout exports.
+
+A state remembers, for one analysis window, the fingerprints of every history
+entry already processed, the non-music rows that won deduplication (so a new
+watch of the same title can supersede them) and the resulting final_df.
+A newer export whose entries contain all of a state's fingerprints only needs
+its new entries processed.
+"""
+
+from pathlib import Path
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from atomic_file import atomic_write
+
+
+STATE_DIR = Path(os.environ.get("YWH_STATE_DIR", "analysis_state"))
+MAX_STATES = int(os.environ.get("YWH_MAX_STATES", 200))
+ENABLED = os.environ.get("YWH_INCREMENTAL", "1") != "0"
+
+# Fingerprints sampled into each state's sidecar for a cheap first match
+ANCHOR_COUNT = 64
+
+_lock = threading.Lock()
+
+
+class AnalysisState:
+    def __init__(
+        self, start, end, fingerprints, dedup_keys, final_df, dedup_key="title", state_id=None
+    ):
+        self.start = start
+        self.end = end
+        self.fingerprints = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        # Non-music rows that survived deduplication:
+        # _fp, title, video_id, category, watched_at
+        self.dedup_keys = dedup_keys
+        # What step 3 deduplicated by: "title" or "video_id"
+        self.dedup_key = dedup_key
+        # final_df plus the _fp column identifying the entry behind each row
+        self.final_df = final_df
+        self.state_id = state_id or uuid.uuid4().hex
+
+    def anchors(self):
+        fps = self.fingerprints
+        if len(fps) <= ANCHOR_COUNT:
+            return fps.tolist()
+        picks = np.linspace(0, len(fps) - 1, ANCHOR_COUNT).astype(int)
+        return fps[picks].tolist()
+
+
+def _window_key(start, end):
+    return [str(start) if start else None, str(end) if end else None]
+
+
+def find_state(fingerprints, start, end, dedup_key="title"):
+    """
+    Most complete stored state for this window and dedup key whose entries
+    are all contained in `fingerprints`, or None.
+    """
+    if not ENABLED or not STATE_DIR.exists():
+        return None
+
+    window = _window_key(start, end)
+    fps = np.asarray(fingerprints, dtype=np.uint64)
+    current = set(fps.tolist())
+
+    candidates = []
+    for sidecar in STATE_DIR.glob("*.json"):
+        try:
+            meta = json.loads(sidecar.read_text())
+        except (OSError, ValueError):
+            continue
+        if meta.get("window") != window or meta.get("dedup_key", "title") != dedup_key:
+            continue
+        if all(a in current for a in meta.get("anchors", [])):
+            candidates.append(meta)
+
+    for meta in sorted(candidates, key=lambda m: m.get("entries", 0), reverse=True):
+        try:
+            state = pd.read_pickle(STATE_DIR / f"{meta['id']}.pkl")
+        except (OSError, ValueError, KeyError):
+            continue
+        if np.isin(state.fingerprints, fps).all():
+            return state
+    return None
+
+
+def save_state(state, replaces=None):
+    """Persist a state (and drop the one it supersedes), evicting old ones."""
+    if not ENABLED:
+        return
+
+    with _lock:
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        atomic_write(
+            STATE_DIR / f"{state.state_id}.pkl",
+            lambda tmp: pd.to_pickle(state, tmp),
+        )
+        meta = {
+            "id": state.state_id,
+            "window": _window_key(state.start, state.end),
+            "dedup_key": state.dedup_key,
+            "entries": int(len(state.fingerprints)),
+            "anchors": state.anchors(),
+        }
+        atomic_write(
+            STATE_DIR / f"{state.state_id}.json",
+            lambda tmp: Path(tmp).write_text(json.dumps(meta)),
+        )
+
+        if replaces is not None and replaces.state_id != state.state_id:
+            _remove(replaces.state_id)
+
+        sidecars = sorted(STATE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for sidecar in sidecars[: max(0, len(sidecars) - MAX_STATES)]:
+            _remove(sidecar.stem)
+
+
+def _remove(state_id):
+    for suffix in (".json", ".pkl"):
+        try:
+            (STATE_DIR / f"{state_id}{suffix}").unlink()
+        except FileNotFoundError:
+            pass
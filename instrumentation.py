@@ -0,0 +1,143 @@
+"""
+Per-step instrumentation of pipeline runs.
+
+Steps are recorded in the run's `stats` dict (stats["steps"]) next to the
+counters the fetcher already keeps, so the report travels wherever stats go:
+back from worker processes, into the app's diagnostics panel and the API.
+Each record has wall time, CPU time of the thread running the step, rows in
+and out, the RSS delta and how much the API request, byte and cache counters
+moved during the step.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import importlib.util
+import io
+import json
+import os
+import threading
+import time
+import uuid
+
+
+# JSON lines file every run's steps are appended to; unset = off
+RUN_LOG = os.environ.get("YWH_RUN_LOG")
+PROFILE_DIR = Path(os.environ.get("YWH_PROFILE_DIR", "profiles"))
+
+# stats counters reported as per-step deltas
+COUNTERS = [
+    "api_requests",
+    "bytes_received",
+    "cache_hits",
+    "cache_misses",
+    "known_unavailable",
+]
+
+# Profilers usable here; pyinstrument is optional (not in requirements.txt)
+PROFILERS = ["cprofile"] + (
+    ["pyinstrument"] if importlib.util.find_spec("pyinstrument") else []
+)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_log_lock = threading.Lock()
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+@contextmanager
+def step(stats, name, rows_in=None):
+    """
+    Record the enclosed block as step `name` in stats["steps"]. Yields the
+    record; set record["rows_out"] inside the block. No-op when stats is None.
+    """
+    if stats is None:
+        yield {}
+        return
+
+    record = {"step": name, "rows_in": rows_in, "rows_out": None}
+    before = {c: stats.get(c, 0) for c in COUNTERS}
+    rss = current_rss()
+    wall = time.perf_counter()
+    # CPU of this thread only: other sessions' steps share the process
+    cpu = time.thread_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall, 4)
+        record["cpu_s"] = round(time.thread_time() - cpu, 4)
+        after = current_rss()
+        record["rss_delta_mb"] = (
+            round((after - rss) / 2**20, 1) if rss is not None else None
+        )
+        for c in COUNTERS:
+            record[c] = stats.get(c, 0) - before[c]
+        stats.setdefault("steps", []).append(record)
+
+
+def emit(stats, **context):
+    """Append the run's step records to RUN_LOG as JSON lines."""
+    if not RUN_LOG or not stats.get("steps"):
+        return
+    run_id = uuid.uuid4().hex
+    ts = datetime.now(timezone.utc).isoformat()
+    lines = [
+        json.dumps({"run_id": run_id, "ts": ts, **context, **record}, default=str)
+        for record in stats["steps"]
+    ]
+    with _log_lock, open(RUN_LOG, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profiled(kind="cprofile"):
+    """
+    Profile the enclosed block. kind="cprofile" (deterministic, calling
+    thread only) or "pyinstrument" (sampling; needs pyinstrument installed).
+    Yields a dict that gets "path" (saved profile) and "summary" (text).
+    """
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    result = {"kind": kind}
+
+    if kind == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            path = PROFILE_DIR / f"{name}.html"
+            path.write_text(profiler.output_html(), encoding="utf-8")
+            result["path"] = str(path)
+            result["summary"] = profiler.output_text()
+        return
+
+    if kind != "cprofile":
+        raise ValueError(f"Unknown profiler: {kind}")
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        path = PROFILE_DIR / f"{name}.prof"
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        result["path"] = str(path)
+        result["summary"] = out.getvalue()
@@ -0,0 +1,378 @@
+"""
+In-process scheduler for analysis jobs.
+
+Jobs run FIFO on a fixed number of worker threads. Each owner (a browser
+session) has at most one live job, so one user cannot fill the queue. Waiting
+callers block on a condition that is notified whenever the queue or a job's
+progress changes, instead of polling. Jobs whose owner stops waiting for them
+(a closed tab) are cancelled after a grace period; jobs without an owner
+(API submissions) run to completion and are kept for polling.
+
+The CPU-heavy part of a job runs in a process pool (run_in_process), so
+pandas work is not bound by the GIL the Streamlit sessions share; progress
+events are relayed back to the job and cancellation forwarded to the child.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.managers import SyncManager
+from statistics import mean
+import collections
+import heapq
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+
+import key_scheduler
+
+
+ANALYSIS_WORKERS = int(
+    os.environ.get("YWH_ANALYSIS_WORKERS", min(4, os.cpu_count() or 1))
+)
+# Processes running job bodies; 0 runs them in the worker thread instead
+PROCESS_WORKERS = int(os.environ.get("YWH_PROCESS_WORKERS", ANALYSIS_WORKERS))
+# Jobs nobody has waited on for this long are cancelled / forgotten
+STALE_AFTER = float(os.environ.get("YWH_JOB_STALE_SECONDS", 30))
+# Finished jobs without an owner (API clients) are kept this long for polling
+RETENTION = float(os.environ.get("YWH_JOB_RETENTION_SECONDS", 3600))
+
+# Wait estimate before any job has finished, and how many durations to average
+DEFAULT_DURATION = 60.0
+DURATION_HISTORY = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class _Manager(SyncManager):
+    """SyncManager that also holds the per-key API limiters for all workers."""
+
+
+_Manager.register(
+    "key_limiter", callable=key_scheduler.get_limiter, exposed=("acquire", "release")
+)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, scheduler, fn, owner=None, key=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.key = key
+        self.state = QUEUED
+        self.progress = (0, "Waiting for analysis slot...")
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.last_seen = self.submitted_at
+        self.cancel_requested = False
+        self._fn = fn
+        self._scheduler = scheduler
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def report(self, percent, message):
+        """Progress callback handed to the job; also where cancellation lands."""
+        if self.cancel_requested:
+            raise JobCancelled(self.id)
+        with self._scheduler._cond:
+            self.progress = (percent, message)
+            self._scheduler._changed()
+
+
+class JobScheduler:
+    def __init__(self, workers=ANALYSIS_WORKERS, stale_after=STALE_AFTER):
+        self.workers = max(1, workers)
+        self.stale_after = stale_after
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._running = {}
+        self._jobs = {}
+        self._by_owner = {}
+        self._durations = collections.deque(maxlen=DURATION_HISTORY)
+        self._version = 0
+
+        for i in range(self.workers):
+            threading.Thread(
+                target=self._work, name=f"analysis-worker-{i}", daemon=True
+            ).start()
+        # Separate from the workers so jobs are reaped while all of them are busy
+        threading.Thread(target=self._reaper, name="analysis-reaper", daemon=True).start()
+
+    def _changed(self):
+        # Caller holds self._cond
+        self._version += 1
+        self._cond.notify_all()
+
+    def submit(self, fn, owner=None, key=None):
+        """
+        Queue fn(progress) and return its Job. An owner's live job for the
+        same key is returned as-is; one for another key is cancelled.
+        """
+        with self._cond:
+            existing = self._by_owner.get(owner) if owner is not None else None
+            if existing is not None and not existing.finished:
+                if key is not None and existing.key == key:
+                    existing.last_seen = time.monotonic()
+                    return existing
+                self._cancel(existing)
+
+            job = Job(self, fn, owner=owner, key=key)
+            self._jobs[job.id] = job
+            if owner is not None:
+                self._by_owner[owner] = job
+            self._queue.append(job)
+            self._changed()
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        """The queued or running job without an owner for `key`, if any."""
+        with self._cond:
+            for job in self._jobs.values():
+                if job.key == key and job.owner is None and not job.finished:
+                    return job
+            return None
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._cancel(job)
+
+    def _cancel(self, job):
+        if job.state == QUEUED:
+            self._queue.remove(job)
+            self._finish(job, CANCELLED)
+        elif job.state == RUNNING:
+            # Running jobs stop at their next progress report
+            job.cancel_requested = True
+        self._changed()
+
+    def release(self, job):
+        """Forget a finished job once its owner has collected the result."""
+        with self._cond:
+            self._jobs.pop(job.id, None)
+            if self._by_owner.get(job.owner) is job:
+                del self._by_owner[job.owner]
+
+    def position(self, job):
+        """1-based place among queued jobs, or 0 once it has started."""
+        with self._cond:
+            if job.state != QUEUED:
+                return 0
+            return self._queue.index(job) + 1
+
+    def estimated_wait(self, job):
+        """Seconds until `job` should start, from recent job durations."""
+        with self._cond:
+            if job.state != QUEUED:
+                return 0.0
+            avg = mean(self._durations) if self._durations else DEFAULT_DURATION
+            now = time.monotonic()
+            free_at = [max(avg - (now - j.started_at), 0.0) for j in self._running.values()]
+            free_at += [0.0] * (self.workers - len(free_at))
+            heapq.heapify(free_at)
+            for ahead in self._queue:
+                if ahead is job:
+                    break
+                heapq.heapreplace(free_at, free_at[0] + avg)
+            return free_at[0]
+
+    def wait(self, job, since=None, timeout=5.0):
+        """
+        Block until anything changed after version `since` (or `timeout`),
+        marking the job as still wanted. Returns the current version.
+        """
+        with self._cond:
+            job.last_seen = time.monotonic()
+            if since is not None and not job.finished:
+                self._cond.wait_for(
+                    lambda: self._version != since or job.finished, timeout
+                )
+                job.last_seen = time.monotonic()
+            return self._version
+
+    def _finish(self, job, state, result=None, error=None):
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished_at = time.monotonic()
+
+    def _reap(self):
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            if job.owner is None:
+                # Nobody waits on ownerless jobs; they are only forgotten
+                if job.finished and now - job.finished_at >= RETENTION:
+                    self._jobs.pop(job.id, None)
+                continue
+            if now - job.last_seen < self.stale_after:
+                continue
+            if job.finished:
+                self._jobs.pop(job.id, None)
+                if self._by_owner.get(job.owner) is job:
+                    del self._by_owner[job.owner]
+            elif not job.cancel_requested:
+                self._cancel(job)
+
+    def _reaper(self):
+        while True:
+            time.sleep(self.stale_after / 2)
+            with self._cond:
+                self._reap()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.state = RUNNING
+                job.started_at = time.monotonic()
+                self._running[job.id] = job
+                self._changed()
+
+            state, result, error = DONE, None, None
+            try:
+                result = job._fn(job.report)
+            except JobCancelled:
+                state = CANCELLED
+            except Exception as e:
+                state, error = FAILED, e
+
+            with self._cond:
+                del self._running[job.id]
+                self._finish(job, state, result, error)
+                if state == DONE:
+                    self._durations.append(job.finished_at - job.started_at)
+                self._changed()
+
+
+_pool = None
+_manager = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _manager
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the parent has many threads, which fork does not mix with
+            ctx = multiprocessing.get_context("spawn")
+            if _manager is None:
+                _manager = _Manager(ctx=ctx)
+                _manager.start()
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESS_WORKERS,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(_manager.address,),
+            )
+        return _pool, _manager
+
+
+def _init_worker(manager_address):
+    # API key limits are shared with the other workers through the manager
+    manager = _Manager(address=manager_address)
+    manager.connect()
+    key_scheduler.share_limiters(manager.key_limiter)
+
+    # Each worker process loads the step modules once, before its first job
+    import pipeline
+
+    pipeline.warm_up()
+
+
+def _noop():
+    pass
+
+
+def start_pool():
+    """Start the worker processes now rather than on the first job."""
+    if PROCESS_WORKERS <= 0:
+        return
+    pool, _ = _get_pool()
+    # Workers are spawned on demand, one per submitted task without an idle one
+    for future in [pool.submit(_noop) for _ in range(PROCESS_WORKERS)]:
+        future.result()
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _call(fn, args, kwargs, events, cancel):
+    # Runs in the child process
+    def progress(percent, message):
+        if cancel.is_set():
+            raise JobCancelled()
+        events.put((percent, message))
+
+    try:
+        return fn(*args, progress=progress, **kwargs)
+    finally:
+        events.put(None)
+
+
+def run_in_process(fn, *args, progress, **kwargs):
+    """
+    fn(*args, progress=..., **kwargs) in the process pool, relaying its
+    progress events to `progress`. fn must be importable (module level) and
+    its arguments and result picklable. If `progress` raises JobCancelled,
+    the child is told to stop at its next progress event.
+    """
+    if PROCESS_WORKERS <= 0:
+        return fn(*args, progress=progress, **kwargs)
+
+    pool, manager = _get_pool()
+    events = manager.Queue()
+    cancel = manager.Event()
+    try:
+        future = pool.submit(_call, fn, args, kwargs, events, cancel)
+    except BrokenProcessPool:
+        _reset_pool()
+        pool, manager = _get_pool()
+        future = pool.submit(_call, fn, args, kwargs, events, cancel)
+
+    try:
+        while True:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            if event is None:
+                break
+            progress(*event)
+    except JobCancelled:
+        cancel.set()
+        raise
+
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        # A crashed child (e.g. out of memory) takes the pool with it
+        _reset_pool()
+        raise
@@ -0,0 +1,302 @@
+"""
+Quota-aware scheduling of YouTube Data API keys.
+
+Key state lives in memory and is only written to api_key_status.json when a
+key is exhausted or a fetch finishes. Writes are atomic and lock-protected so
+several sessions (or processes) can share the file.
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from atomic_file import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+
+KEY_STATE_FILE = os.environ.get("YT_KEY_STATE_FILE", "api_key_status.json")
+if os.environ.get("YT_TRANSPORT") == "replay":
+    # Replayed 403s must not retire the real keys (see yt_transport)
+    KEY_STATE_FILE = os.environ.get(
+        "YT_REPLAY_KEY_STATE_FILE",
+        os.path.join(tempfile.gettempdir(), "api_key_status.replay.json"),
+    )
+DAILY_QUOTA = int(os.environ.get("YT_KEY_DAILY_QUOTA", 10000))
+# Per-key caps shared by every fetch in the process (and its worker processes)
+KEY_MAX_CONCURRENCY = int(os.environ.get("YT_KEY_MAX_CONCURRENCY", 4))
+KEY_MAX_QPS = float(os.environ.get("YT_KEY_MAX_QPS", 10))
+# Seconds a key rests after a 429 rateLimitExceeded (in memory only)
+KEY_COOLDOWN = float(os.environ.get("YT_KEY_COOLDOWN", 1.0))
+
+# YouTube quotas reset at midnight Pacific time
+QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+
+
+def quota_day():
+    return datetime.now(QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+def key_hash(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._fh = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fh = open(self.path, "a")
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+
+
+class KeyScheduler:
+    """
+    Hands out the key with the most quota left today and tracks units spent.
+    """
+
+    def __init__(self, keys, path=KEY_STATE_FILE, daily_quota=DAILY_QUOTA):
+        self.keys = list(keys)
+        self.path = path
+        self.daily_quota = daily_quota
+        self._hashes = {k: key_hash(k) for k in self.keys}
+        self._lock = threading.RLock()
+        self._state = {}
+        # Units spent by this process since the last save, per key hash
+        self._unsaved = {}
+        # Monotonic time each rate-limited key may be used again, per key hash
+        self._cooling = {}
+        self.refresh()
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+        except Exception:
+            return {}
+
+        state = {}
+        for h, val in raw.items():
+            if isinstance(val, str):
+                # Legacy format: {hash: "YYYY-MM-DD"} meant exhausted that day
+                val = {"day": val, "units": 0, "exhausted": True}
+            state[h] = val
+        return state
+
+    def _entry(self, h, today):
+        entry = self._state.get(h)
+        if entry is None or entry.get("day") != today:
+            entry = {"day": today, "units": 0, "exhausted": False}
+            self._state[h] = entry
+        return entry
+
+    def refresh(self):
+        """Reload key state written by other sessions."""
+        with self._lock:
+            state = self._read_file()
+            today = quota_day()
+            for h, units in self._unsaved.items():
+                entry = state.get(h)
+                if entry is None or entry.get("day") != today:
+                    entry = state[h] = {"day": today, "units": 0, "exhausted": False}
+                entry["units"] = entry.get("units", 0) + units
+            self._state = state
+
+    def working_keys(self):
+        """
+        Keys with quota left today that are not cooling down, most remaining
+        quota first.
+        """
+        today = quota_day()
+        now = time.monotonic()
+        with self._lock:
+            usable = []
+            for k in self._with_quota(today):
+                if self._cooling.get(self._hashes[k], 0) <= now:
+                    usable.append(k)
+            return sorted(usable, key=lambda k: self._state[self._hashes[k]]["units"])
+
+    def _with_quota(self, today):
+        for k in self.keys:
+            entry = self._entry(self._hashes[k], today)
+            if not entry["exhausted"] and entry["units"] < self.daily_quota:
+                yield k
+
+    def acquire(self, cost=1, exclude=()):
+        """
+        Reserve `cost` quota units on the least used working key and return it,
+        or None when every key is exhausted or excluded.
+        """
+        with self._lock:
+            candidates = [k for k in self.working_keys() if k not in exclude]
+            if not candidates:
+                return None
+            key = candidates[0]
+            h = self._hashes[key]
+            self._state[h]["units"] += cost
+            self._unsaved[h] = self._unsaved.get(h, 0) + cost
+            return key
+
+    def cool_down(self, key, seconds=KEY_COOLDOWN):
+        """Rest a rate-limited key for `seconds`; it keeps its daily quota."""
+        with self._lock:
+            h = self._hashes[key]
+            self._cooling[h] = max(self._cooling.get(h, 0), time.monotonic() + seconds)
+
+    def cooldown_left(self, exclude=()):
+        """
+        Seconds until a key with quota left (not in `exclude`) finishes
+        cooling down, or None when no such key is cooling.
+        """
+        now = time.monotonic()
+        with self._lock:
+            waits = [
+                self._cooling.get(self._hashes[k], 0) - now
+                for k in self._with_quota(quota_day())
+                if k not in exclude
+            ]
+        waits = [w for w in waits if w > 0]
+        return min(waits) if waits else None
+
+    def mark_exhausted(self, key):
+        with self._lock:
+            self._entry(self._hashes[key], quota_day())["exhausted"] = True
+        self.save()
+
+    def save(self):
+        """Merge in-memory state into the state file with an atomic write."""
+        with self._lock, _FileLock(self.path):
+            on_disk = self._read_file()
+            today = quota_day()
+            for h, entry in self._state.items():
+                if entry.get("day") != today:
+                    continue
+                disk = on_disk.get(h)
+                if disk is None or disk.get("day") != today:
+                    disk = {"day": today, "units": 0, "exhausted": False}
+                on_disk[h] = {
+                    "day": today,
+                    "units": disk.get("units", 0) + self._unsaved.get(h, 0),
+                    "exhausted": bool(disk.get("exhausted") or entry["exhausted"]),
+                }
+
+            def write(tmp_path):
+                with open(tmp_path, "w") as f:
+                    json.dump(on_disk, f)
+
+            atomic_write(self.path, write)
+
+            self._unsaved.clear()
+            self._state = on_disk
+
+
+class KeyLimiter:
+    """
+    Per-key concurrency cap and minimum spacing between requests.
+    """
+
+    def __init__(self, max_concurrency=KEY_MAX_CONCURRENCY, max_qps=KEY_MAX_QPS):
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._interval = 1.0 / max_qps if max_qps else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def acquire(self):
+        """Take a slot and return the seconds to wait before sending."""
+        self._slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self._interval
+        return max(wait, 0.0)
+
+    def release(self):
+        self._slots.release()
+
+    def __enter__(self):
+        wait = self.acquire()
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _SharedLimiter(KeyLimiter):
+    """KeyLimiter held by another process (a manager proxy)."""
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+
+    def acquire(self):
+        return self._proxy.acquire()
+
+    def release(self):
+        self._proxy.release()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler over the YT_API_* keys in the environment."""
+    global _scheduler
+    keys = [val for key, val in os.environ.items() if key.startswith("YT_API_") and val]
+    if not keys:
+        raise RuntimeError("No YT_API keys found in .env file")
+
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.keys != keys:
+            _scheduler = KeyScheduler(keys)
+        return _scheduler
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# Returns a proxy to the limiter for a key, when limiters live in another process
+_shared_limiter = None
+
+
+def share_limiters(factory):
+    """
+    Use the limiters `factory(key)` proxies (held by a manager process)
+    instead of per-process ones, so worker processes share the caps.
+    """
+    global _shared_limiter
+    with _limiters_lock:
+        _shared_limiter = factory
+        _limiters.clear()
+
+
+def get_limiter(key):
+    """Process-wide KeyLimiter for `key`, shared by concurrent fetches."""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            if _shared_limiter is not None:
+                limiter = _SharedLimiter(_shared_limiter(key))
+            else:
+                limiter = KeyLimiter()
+            _limiters[key] = limiter
+        return limiter
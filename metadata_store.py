@@ -0,0 +1,244 @@
+"""
+Persistent video metadata store shared across sessions.
+
+Fetched metadata is kept in a small SQLite database keyed by video_id so that
+repeat uploads (and different users watching the same videos) are served
+locally instead of spending YouTube API quota again.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from video_metadata import VideoMetadata
+
+
+DB_PATH = os.environ.get("YWH_METADATA_DB", "metadata_cache.sqlite3")
+TTL_SECONDS = int(os.environ.get("YWH_METADATA_TTL", 7 * 24 * 3600))
+MAX_ENTRIES = int(os.environ.get("YWH_METADATA_MAX_ENTRIES", 500_000))
+# Ids the API did not return (deleted/private videos) are rechecked after this
+UNAVAILABLE_TTL = int(os.environ.get("YWH_METADATA_UNAVAILABLE_TTL", 30 * 24 * 3600))
+# Seconds before an id claimed for fetching may be claimed by someone else
+CLAIM_LEASE = float(os.environ.get("YWH_METADATA_CLAIM_LEASE", 300))
+
+# SQLite caps the number of bound parameters per statement
+_CHUNK = 500
+
+
+class MetadataStore:
+    """
+    video_id -> metadata record, with TTL expiry and size-based eviction.
+    """
+
+    def __init__(
+        self,
+        path=DB_PATH,
+        ttl=TTL_SECONDS,
+        max_entries=MAX_ENTRIES,
+        unavailable_ttl=UNAVAILABLE_TTL,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.unavailable_ttl = unavailable_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                "video_id TEXT PRIMARY KEY, "
+                "fetched_at REAL NOT NULL, "
+                "data TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS videos_fetched_at ON videos (fetched_at)"
+            )
+            # Ids the API did not return when last requested
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS unavailable ("
+                "video_id TEXT PRIMARY KEY, "
+                "checked_at REAL NOT NULL)"
+            )
+            # Ids being fetched right now, by any process using this database
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS claims ("
+                "video_id TEXT PRIMARY KEY, "
+                "owner TEXT NOT NULL, "
+                "claimed_at REAL NOT NULL)"
+            )
+
+    def get_many(self, video_ids):
+        """
+        Return {video_id: VideoMetadata} for every id that is stored and not expired.
+        """
+        ids = list(video_ids)
+        cutoff = time.time() - self.ttl
+        found = {}
+
+        with self._lock:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i : i + _CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT video_id, data FROM videos "
+                    f"WHERE fetched_at >= ? AND video_id IN ({placeholders})",
+                    [cutoff, *chunk],
+                ).fetchall()
+                for vid, data in rows:
+                    found[vid] = VideoMetadata.loads(vid, data)
+
+        return found
+
+    def put_many(self, records, evict=True):
+        """
+        Insert or refresh records ({video_id: VideoMetadata}) and evict if needed.
+        Pass evict=False for a series of small writes and call evict() once.
+        """
+        if not records:
+            return
+
+        now = time.time()
+        rows = []
+        for vid, rec in records.items():
+            rows.append((vid, now, rec.dumps()))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO videos (video_id, fetched_at, data) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            if evict:
+                self._evict(now)
+
+    def get_unavailable(self, video_ids):
+        """The subset of `video_ids` recently not returned by the API."""
+        ids = list(video_ids)
+        cutoff = time.time() - self.unavailable_ttl
+        found = set()
+
+        with self._lock:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i : i + _CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT video_id FROM unavailable "
+                    f"WHERE checked_at >= ? AND video_id IN ({placeholders})",
+                    [cutoff, *chunk],
+                ).fetchall()
+                found.update(vid for (vid,) in rows)
+
+        return found
+
+    def put_unavailable(self, video_ids):
+        """Remember ids the API did not return (deleted or private videos)."""
+        if not video_ids:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO unavailable (video_id, checked_at) VALUES (?, ?)",
+                [(vid, now) for vid in video_ids],
+            )
+
+    def evict(self):
+        with self._lock, self._conn:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM videos WHERE fetched_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM unavailable WHERE checked_at < ?", (now - self.unavailable_ttl,)
+        )
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM videos WHERE video_id IN ("
+                "SELECT video_id FROM videos ORDER BY fetched_at LIMIT ?)",
+                (excess,),
+            )
+
+    def claim(self, video_ids, owner, lease=CLAIM_LEASE):
+        """
+        Claim ids for fetching on behalf of `owner`. Returns (claimed, taken):
+        the ids `owner` now holds and those another owner is already fetching.
+        Claims older than `lease` seconds are considered abandoned.
+        """
+        ids = list(video_ids)
+        now = time.time()
+        mine = set()
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM claims WHERE claimed_at < ?", (now - lease,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO claims (video_id, owner, claimed_at) "
+                "VALUES (?, ?, ?)",
+                [(vid, owner, now) for vid in ids],
+            )
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i : i + _CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT video_id FROM claims "
+                    f"WHERE owner = ? AND video_id IN ({placeholders})",
+                    [owner, *chunk],
+                ).fetchall()
+                mine.update(vid for (vid,) in rows)
+
+        return [vid for vid in ids if vid in mine], [vid for vid in ids if vid not in mine]
+
+    def claimed(self, video_ids, lease=CLAIM_LEASE):
+        """The subset of `video_ids` someone is still fetching."""
+        ids = list(video_ids)
+        cutoff = time.time() - lease
+        held = set()
+
+        with self._lock:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i : i + _CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT video_id FROM claims "
+                    f"WHERE claimed_at >= ? AND video_id IN ({placeholders})",
+                    [cutoff, *chunk],
+                ).fetchall()
+                held.update(vid for (vid,) in rows)
+
+        return held
+
+    def release(self, video_ids, owner):
+        """Drop `owner`'s claims on `video_ids`."""
+        ids = list(video_ids)
+        with self._lock, self._conn:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i : i + _CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"DELETE FROM claims WHERE owner = ? AND video_id IN ({placeholders})",
+                    [owner, *chunk],
+                )
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()
+        return count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store instance."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataStore()
+        return _store
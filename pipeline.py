@@ -5,92 +5,483 @@ In-memory pipeline for FastAPI/web usage:
 - Returns DataFrames plus optional CSV bytes, KPIs, and Plotly-ready figures
 """
 
+import time
+
+# Measured from here to the end of this module: pipeline import time
+_IMPORT_STARTED = time.perf_counter()
+
+from datetime import date
 from importlib import util
 from pathlib import Path
 import io
-import json
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import pandas as pd
 import numpy as np
-import plotly.express as px
+
+from history import DEFAULT_END, DEFAULT_START, in_window, iter_history
+import incremental
+import instrumentation
+import result_cache
+from video_metadata import VideoMetadata
 
 ROOT = Path(__file__).parent
 
+CLEANING_STEPS = [
+    ("step3", "3_deduplicate.py"),
+    ("step4", "4_remove_live.py"),
+    ("step5", "5_remove_unavailable.py"),
+    ("step6", "6_remove_videos.py"),
+    ("step7", "7_to_the_hour.py"),
+    ("step8", "8_the_finishing.py"),
+]
+
+
+ALL_STEPS = [
+    ("step1", "1_yt_vid_metadata.py"),
+    ("step2", "2_merged_data.py"),
+] + CLEANING_STEPS
+
+logger = logging.getLogger(__name__)
+
+# Step modules by filename, executed once per process
+_steps: Dict[str, Any] = {}
+_steps_lock = threading.Lock()
+
+
+def load_step(module_name: str, filename: str, reload: bool = False):
+    """Step module from `filename`; loaded on first use, then cached."""
+    with _steps_lock:
+        module = _steps.get(filename)
+        if module is not None and not reload:
+            return module
+
+        path = ROOT / filename
+        spec = util.spec_from_file_location(module_name, path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"Cannot load {filename}")
+        module = util.module_from_spec(spec)
+        spec.loader.exec_module(module)  # type: ignore[attr-defined]
+        _steps[filename] = module
+        return module
+
+
+def warm_up(figures: bool = False) -> Dict[str, float]:
+    """Load every step module (and plotly with figures=True) ahead of the
+    first request. Returns the import and warm-up timings in seconds.
+    """
+    started = time.perf_counter()
+    for module_name, filename in ALL_STEPS:
+        load_step(module_name, filename)
+    report = {
+        "import_seconds": round(IMPORT_SECONDS, 3),
+        "steps_seconds": round(time.perf_counter() - started, 3),
+    }
+    if figures:
+        plotly_started = time.perf_counter()
+        import plotly.express  # noqa: F401
+        import plotly.graph_objects  # noqa: F401
 
-def load_step(module_name: str, filename: str):
-    path = ROOT / filename
-    spec = util.spec_from_file_location(module_name, path)
-    if spec is None or spec.loader is None:
-        raise ImportError(f"Cannot load {filename}")
-    module = util.module_from_spec(spec)
-    spec.loader.exec_module(module)  # type: ignore[attr-defined]
-    return module
+        report["plotly_seconds"] = round(time.perf_counter() - plotly_started, 3)
+    report["cold_start_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+    logger.info("Pipeline warm-up: %s", report)
+    return report
 
 
 def _prepare_metadata_in_memory(
-    history: List[dict], cache: Optional[Dict[str, dict]] = None
-) -> Tuple[List[dict], List[dict]]:
-    """Mimic step1 logic without touching disk. Returns (history_2025, cache_list)."""
+    history: List[dict],
+    stats: Optional[Dict[str, Any]] = None,
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[List[dict], List[VideoMetadata]]:
+    """Mimic step1 logic without writing CSVs. Returns (history_window, records)."""
     step1 = load_step("step1", "1_yt_vid_metadata.py")
 
-    cache = cache or {}
-    history_2025 = [e for e in history if step1.entry_year(e) == 2025]
+    history_window = [e for e in history if in_window(e.get("time"), start, end)]
 
-    watch_times: Dict[str, Dict[str, Any]] = {}
     video_ids = set()
 
-    for e in history_2025:
+    for e in history_window:
         url = e.get("titleUrl", "")
         if "watch?v=" not in url:
             continue
         vid = url.replace("\\u003d", "=").split("watch?v=")[1].split("&")[0]
         video_ids.add(vid)
-        iso_time = e.get("time")
-        if vid not in watch_times:
-            watch_times[vid] = {"watched_at_sql": step1.iso_to_mysql(iso_time)}
 
-    missing = [vid for vid in video_ids if vid not in cache]
-    if missing:
-        fetched = step1.fetch_metadata(missing, watch_times)
-        cache.update(fetched)
+    records = {}
+    if video_ids:
+        records = step1.fetch_metadata(video_ids, stats=stats, progress=progress)
 
-    for vid in video_ids:
-        if vid not in cache:
-            continue
-        wt = watch_times.get(vid)
-        if wt:
-            cache[vid]["watched_at_sql"] = wt.get("watched_at_sql")
-        snippet = cache[vid].get("snippet")
-        if snippet:
-            if "publishedAt" in snippet:
-                snippet["publishedAt_sql"] = step1.iso_to_mysql(snippet["publishedAt"])
-                snippet.pop("publishedAt", None)
-            elif "publishedAt_sql" not in snippet:
-                snippet["publishedAt_sql"] = ""
-
-    return history_2025, list(cache.values())
-
-
-def run_pipeline(history: List[dict]) -> pd.DataFrame:
-    """Run the full pipeline in memory and return final_df."""
-    step2 = load_step("step2", "2_merged_data.py")
+    return history_window, list(records.values())
+
+
+def clean_chained(merged_df: pd.DataFrame) -> pd.DataFrame:
+    """Run cleaning steps 3-8 one module at a time."""
+    df = merged_df
+    for module_name, filename in CLEANING_STEPS:
+        df = load_step(module_name, filename).run(df)
+    return df
+
+
+def clean_fused(
+    merged_df: pd.DataFrame,
+    live_threshold: int = 3600,
+    duration_cap: int = 14400,
+) -> pd.DataFrame:
+    """Apply steps 3-8 in one pass and return the same frame as clean_chained.
+
+    watched_at is parsed once, rows are ordered with a single sort, and every
+    filter is computed as a mask over the input so that only the final
+    selection is materialized.
+    """
+    return _clean_fused(merged_df, live_threshold, duration_cap)[0]
+
+
+def _clean_fused(
+    merged_df: pd.DataFrame,
+    live_threshold: int = 3600,
+    duration_cap: int = 14400,
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    """clean_fused, plus the positions of the rows step 3 alone would keep."""
+    watched = merged_df["watched_at"]
+    if not pd.api.types.is_datetime64_any_dtype(watched):
+        watched = pd.to_datetime(watched, errors="coerce", utc=True, format="ISO8601")
+    duration = pd.to_numeric(merged_df["duration_seconds"], errors="coerce")
+
+    # Step 3: last watch per key among non-music videos, in watch order
     step3 = load_step("step3", "3_deduplicate.py")
-    step4 = load_step("step4", "4_remove_live.py")
-    step5 = load_step("step5", "5_remove_unavailable.py")
-    step6 = load_step("step6", "6_remove_videos.py")
-    step7 = load_step("step7", "7_to_the_hour.py")
-    step8 = load_step("step8", "8_the_finishing.py")
-
-    history_2025, cache_list = _prepare_metadata_in_memory(history)
-
-    df = step2.run(history_2025, cache_list)
-    df = step3.run(df)
-    df = step4.run(df)
-    df = step5.run(df)
-    df = step6.run(df)
-    df = step7.run(df)
-    final_df = step8.run(df)
+    music = step3.is_music(merged_df)
+    order = step3.watch_order(watched, music)
+    latest = step3.latest_per_key(step3.dedup_keys(merged_df), order, music)
+
+    # Step 4: long live streams
+    live = merged_df["title"].astype(str).str.lower().str.contains(
+        r"live|stream", regex=True, na=False
+    ) & (duration > live_threshold)
+
+    # Step 5: unavailable/deleted videos
+    available = merged_df["channel"].notna() & duration.notna()
+
+    deduped = order[latest[order]]
+    keep = latest & ~live.to_numpy() & available.to_numpy()
+    positions = order[keep[order]]
+
+    df = merged_df.take(positions)
+    df.index = pd.RangeIndex(len(df))
+    df.columns = df.columns.str.strip().str.lower()
+
+    # Steps 6-8: cap duration, floor timestamps, add day of week
+    df["duration_seconds"] = (
+        duration.iloc[positions].clip(upper=duration_cap).reset_index(drop=True)
+    )
+    watched = watched.iloc[positions].reset_index(drop=True)
+    to_naive_utc = load_step("step7", "7_to_the_hour.py").to_naive_utc
+    df["watched_at"] = to_naive_utc(watched).dt.floor("h")
+    df["published_at"] = to_naive_utc(df["published_at"]).dt.floor("h")
+    df["day_of_week"] = df["watched_at"].dt.day_name()
+
+    return df, deduped
+
+
+FETCH_MESSAGE = "[1/8] Fetching metadata and filtering watch history..."
+MERGE_MESSAGE = "[2/8] Merging watch history with metadata..."
+STEP_MESSAGES = {
+    "step3": "[3/8] Deduplicating non-music videos...",
+    "step4": "[4/8] Removing live streams...",
+    "step5": "[5/8] Removing unavailable/deleted videos...",
+    "step6": "[6/8] Capping long videos and sorting...",
+    "step7": "[7/8] Flooring timestamps...",
+    "step8": "[8/8] Finishing touches...",
+}
+FUSED_MESSAGE = "[3-8/8] Cleaning (dedup, live/unavailable removal, capping, flooring)..."
+
+
+def _fetch_progress(progress: Optional[Callable[[int, str], None]]):
+    """Map per-batch fetch progress onto 10-50% of the overall bar."""
+    if progress is None:
+        return None
+    return lambda done, total: progress(10 + int(40 * done / total), FETCH_MESSAGE)
+
 
+def fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """64-bit fingerprint per row from (watched_at, video_id)."""
+    return pd.util.hash_pandas_object(
+        df[["watched_at", "video_id"]], index=False
+    ).to_numpy()
+
+
+def entry_fingerprints(history: List[dict]) -> np.ndarray:
+    """Fingerprints of raw history entries, matching those of the merged rows."""
+    step2 = load_step("step2", "2_merged_data.py")
+    frame = pd.DataFrame.from_records(history, columns=["titleUrl", "time"])
+    frame["video_id"] = step2.extract_video_ids(frame["titleUrl"].fillna("").astype(str))
+    frame["watched_at"] = pd.to_datetime(
+        frame["time"], format="ISO8601", utc=True, errors="coerce"
+    )
+    return fingerprints(frame)
+
+
+def _merge(
+    history_window: List[dict],
+    records: List[VideoMetadata],
+    progress: Optional[Callable[[int, str], None]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    if progress:
+        progress(50, MERGE_MESSAGE)
+    with instrumentation.step(stats, "step2", rows_in=len(history_window)) as record:
+        df = load_step("step2", "2_merged_data.py").run(history_window, records)
+        df["_fp"] = fingerprints(df)
+        record["rows_out"] = len(df)
+    return df
+
+
+def _clean(
+    merged_df: pd.DataFrame,
+    engine: str = "fused",
+    progress: Optional[Callable[[int, str], None]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    keep_deduped: bool = False,
+) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """Cleaned frame, and (with keep_deduped) the output of step 3 alone."""
+    if engine not in ("fused", "chained"):
+        raise ValueError(f"Unknown engine: {engine}")
+
+    deduped = None
+    if engine == "fused":
+        if progress:
+            progress(57, FUSED_MESSAGE)
+        with instrumentation.step(stats, "clean_fused", rows_in=len(merged_df)) as record:
+            df, positions = _clean_fused(merged_df)
+            if keep_deduped:
+                deduped = merged_df.take(positions)
+            record["rows_out"] = len(df)
+    else:
+        df = merged_df
+        for i, (module_name, filename) in enumerate(CLEANING_STEPS):
+            if progress:
+                progress(57 + 7 * i, STEP_MESSAGES[module_name])
+            with instrumentation.step(stats, module_name, rows_in=len(df)) as record:
+                df = load_step(module_name, filename).run(df)
+                record["rows_out"] = len(df)
+            if keep_deduped and module_name == "step3":
+                deduped = df
+
+    if progress:
+        progress(100, "Processing complete!")
+    return df, deduped
+
+
+def _dedup_keys(deduped: pd.DataFrame) -> pd.DataFrame:
+    """Non-music rows left by step 3, slimmed to what step 3 compares."""
+    non_music = ~load_step("step3", "3_deduplicate.py").is_music(deduped)
+    return deduped.loc[non_music, ["_fp", "title", "video_id", "category", "watched_at"]]
+
+
+# Low-cardinality text columns stored as categoricals
+CATEGORICAL_COLUMNS = ["channel", "category", "category_id", "type", "day_of_week"]
+# High-cardinality text columns stored as Arrow-backed strings
+STRING_COLUMNS = ["title", "url", "video_id"]
+# Counts stored as the smallest nullable integer type that fits
+INTEGER_COLUMNS = ["duration_seconds", "views", "likes"]
+
+
+def _smallest_int_dtype(values: pd.Series) -> str:
+    if values.notna().any():
+        lo, hi = values.min(), values.max()
+        for dtype, info in (
+            ("Int8", np.iinfo(np.int8)),
+            ("Int16", np.iinfo(np.int16)),
+            ("Int32", np.iinfo(np.int32)),
+        ):
+            if info.min <= lo and hi <= info.max:
+                return dtype
+    return "Int64"
+
+
+def compact_dtypes(final_df: pd.DataFrame) -> pd.DataFrame:
+    """Return final_df with a memory-optimized schema.
+
+    Categoricals for low-cardinality text, nullable small integers for
+    durations and counts, and Arrow-backed strings for titles and URLs.
+    """
+    df = final_df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(pd.StringDtype("pyarrow"))
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce").round()
+            df[col] = values.astype(_smallest_int_dtype(values))
+    return df
+
+
+def column_memory(df: pd.DataFrame) -> Dict[str, int]:
+    """Bytes used by each column (deep), plus a "total" entry."""
+    usage = df.memory_usage(index=False, deep=True)
+    report = {col: int(nbytes) for col, nbytes in usage.items()}
+    report["total"] = int(usage.sum())
+    return report
+
+
+def run_pipeline(
+    history: List[dict],
+    stats: Optional[Dict[str, Any]] = None,
+    engine: str = "fused",
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+    progress: Optional[Callable[[int, str], None]] = None,
+) -> pd.DataFrame:
+    """Run the full pipeline in memory and return final_df.
+
+    Only entries watched between `start` and `end` (inclusive, None = open)
+    are analyzed. Metadata cache hit/miss counts are recorded in `stats` when
+    given. engine="chained" runs steps 3-8 module by module instead of
+    clean_fused. `progress(percent, message)` is called as steps complete.
+    The result uses the compact_dtypes schema; its per-column memory is
+    recorded in stats["memory_bytes"]. Per-step timings, rows and counter
+    deltas are recorded in stats["steps"] (see instrumentation.py).
+    """
+    stats = stats if stats is not None else {}
+    if progress:
+        progress(10, FETCH_MESSAGE)
+    with instrumentation.step(stats, "step1", rows_in=len(history)) as record:
+        history_window, records = _prepare_metadata_in_memory(
+            history, stats=stats, start=start, end=end, progress=_fetch_progress(progress)
+        )
+        record["rows_out"] = len(history_window)
+
+    merged = _merge(history_window, records, progress, stats)
+    df, _ = _clean(merged, engine, progress, stats)
+    with instrumentation.step(stats, "compact", rows_in=len(df)) as record:
+        final_df = compact_dtypes(df.drop(columns="_fp"))
+        record["rows_out"] = len(final_df)
+    stats["memory_bytes"] = column_memory(final_df)
+    instrumentation.emit(stats, entry_point="run_pipeline", engine=engine)
+    return final_df
+
+
+def run_incremental(
+    history: List[dict],
+    stats: Optional[Dict[str, Any]] = None,
+    engine: str = "fused",
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+    progress: Optional[Callable[[int, str], None]] = None,
+) -> pd.DataFrame:
+    """Like run_pipeline, but reuse the stored analysis of an older export.
+
+    When every entry of a previously analyzed upload (same window) is present
+    in `history`, only the new entries are fetched and cleaned, then merged
+    into the stored final_df. Deduplication stays correct across the
+    boundary: stored non-music rows whose dedup key (title or video id) is
+    watched again in the delta compete with the new rows in step 3 and drop out if superseded.
+    The result is stored for the next upload. `stats` gets "incremental",
+    "delta_entries", "memory_bytes" and the per-step records in "steps".
+    """
+    stats = stats if stats is not None else {}
+    step3 = load_step("step3", "3_deduplicate.py")
+    with instrumentation.step(stats, "find_state", rows_in=len(history)) as record:
+        history_window = [e for e in history if in_window(e.get("time"), start, end)]
+        fps = entry_fingerprints(history_window)
+        previous = incremental.find_state(fps, start, end, step3.DEDUP_KEY)
+        record["rows_out"] = len(history_window)
+
+    if previous is None:
+        stats["incremental"] = False
+        stats["delta_entries"] = len(history_window)
+        if progress:
+            progress(10, FETCH_MESSAGE)
+        with instrumentation.step(stats, "step1", rows_in=len(history_window)) as record:
+            _, records = _prepare_metadata_in_memory(
+                history_window,
+                stats=stats,
+                start=None,
+                end=None,
+                progress=_fetch_progress(progress),
+            )
+            record["rows_out"] = len(history_window)
+        merged = _merge(history_window, records, progress, stats)
+        # Step 3's winners are only needed when the analysis is stored
+        final, deduped = _clean(
+            merged, engine, progress, stats, keep_deduped=incremental.ENABLED
+        )
+        dedup_keys = None
+        if deduped is not None:
+            with instrumentation.step(stats, "dedup_keys", rows_in=len(deduped)) as record:
+                dedup_keys = _dedup_keys(deduped)
+                record["rows_out"] = len(dedup_keys)
+    else:
+        is_new = ~np.isin(fps, previous.fingerprints)
+        delta = [e for e, new in zip(history_window, is_new) if new]
+        stats["incremental"] = True
+        stats["delta_entries"] = len(delta)
+        if not delta:
+            if progress:
+                progress(100, "Processing complete!")
+            final_df = previous.final_df.drop(columns="_fp")
+            stats["memory_bytes"] = column_memory(final_df)
+            instrumentation.emit(stats, entry_point="run_incremental", engine=engine)
+            return final_df
+
+        if progress:
+            progress(10, FETCH_MESSAGE)
+        with instrumentation.step(stats, "step1", rows_in=len(delta)) as record:
+            _, records = _prepare_metadata_in_memory(
+                delta,
+                stats=stats,
+                start=None,
+                end=None,
+                progress=_fetch_progress(progress),
+            )
+            record["rows_out"] = len(delta)
+        merged = _merge(delta, records, progress, stats)
+
+        with instrumentation.step(stats, "dedup_delta", rows_in=len(merged)) as record:
+            # Stored dedup winners that share a non-music key with the delta
+            delta_keys = step3.dedup_keys(_dedup_keys(merged))
+            old_keys = previous.dedup_keys
+            competing = old_keys[np.isin(step3.dedup_keys(old_keys), delta_keys)]
+
+            deduped = step3.run(pd.concat([competing, merged], ignore_index=True))
+            superseded = set(competing["_fp"]) - set(deduped["_fp"])
+            deduped_new = deduped[deduped["_fp"].isin(merged["_fp"])]
+            record["rows_out"] = len(deduped_new)
+
+        # Deduplication in the engine is a no-op on already deduplicated rows
+        final_new, _ = _clean(deduped_new, engine, progress, stats)
+        old_final = previous.final_df
+        with instrumentation.step(stats, "combine", rows_in=len(old_final) + len(final_new)) as record:
+            final = (
+                pd.concat(
+                    [old_final[~old_final["_fp"].isin(superseded)], final_new],
+                    ignore_index=True,
+                )
+                .sort_values("watched_at", kind="stable")
+                .reset_index(drop=True)
+            )
+            dedup_keys = pd.concat(
+                [old_keys[~old_keys["_fp"].isin(superseded)], _dedup_keys(deduped_new)],
+                ignore_index=True,
+            )
+            record["rows_out"] = len(final)
+
+    with instrumentation.step(stats, "compact", rows_in=len(final)) as record:
+        final = compact_dtypes(final)
+        record["rows_out"] = len(final)
+    with instrumentation.step(stats, "save_state", rows_in=len(final)):
+        incremental.save_state(
+            incremental.AnalysisState(start, end, fps, dedup_keys, final, step3.DEDUP_KEY),
+            replaces=previous,
+        )
+    final_df = final.drop(columns="_fp")
+    stats["memory_bytes"] = column_memory(final_df)
+    instrumentation.emit(stats, entry_point="run_incremental", engine=engine)
     return final_df
 
 
@@ -114,48 +505,42 @@ def compute_kpis(final_df: pd.DataFrame) -> Dict[str, Any]:
 
     return {
         "total_videos": int(total_videos),
-        "total_watch_hours": round(total_hours, 2),
-        "avg_duration_minutes": round(avg_duration_min, 2),
+        "total_watch_hours": round(float(total_hours), 2),
+        "avg_duration_minutes": round(float(avg_duration_min), 2),
         "top_channel": top_channel,
     }
 
 
 def build_plotly_figures(final_df: pd.DataFrame) -> Dict[str, Any]:
     """Create Plotly figures for web display (returned as figures; serialize with fig.to_json())."""
+    import plotly.express as px
+
     figs: Dict[str, Any] = {}
 
     if not final_df.empty:
-        top_channels = (
-            final_df["channel"]
-            .value_counts()
-            .head(10)
-            .reset_index()
-            .rename(columns={"index": "channel", "channel": "count"})
+        # Frames are built explicitly: value_counts().reset_index() column
+        # names differ between pandas versions
+        counts = final_df["channel"].value_counts().head(10)
+        top_channels = pd.DataFrame(
+            {"channel": counts.index.astype(str), "count": counts.to_numpy()}
         )
         figs["top_channels"] = px.bar(
             top_channels, x="channel", y="count", title="Top Channels (count)"
         )
 
         if "day_of_week" in final_df.columns:
-            dow = (
-                final_df["day_of_week"]
-                .value_counts()
-                .reindex(
-                    [
-                        "Monday",
-                        "Tuesday",
-                        "Wednesday",
-                        "Thursday",
-                        "Friday",
-                        "Saturday",
-                        "Sunday",
-                    ]
-                )
-            )
+            days = [
+                "Monday",
+                "Tuesday",
+                "Wednesday",
+                "Thursday",
+                "Friday",
+                "Saturday",
+                "Sunday",
+            ]
+            dow = final_df["day_of_week"].value_counts().reindex(days)
             figs["by_dow"] = px.bar(
-                dow.reset_index().rename(
-                    columns={"index": "day", "day_of_week": "count"}
-                ),
+                pd.DataFrame({"day": days, "count": dow.to_numpy()}),
                 x="day",
                 y="count",
                 title="Views by Day of Week",
@@ -184,24 +569,96 @@ def maybe_catplot(final_df: pd.DataFrame):
     return fig
 
 
-def run_from_bytes(watch_history_bytes: bytes) -> pd.DataFrame:
-    """Convenience: accept uploaded bytes and run the pipeline."""
-    history = json.loads(watch_history_bytes.decode("utf-8"))
-    if not isinstance(history, list):
-        raise ValueError("watch-history JSON must be a list")
-    return run_pipeline(history)
+def run_from_bytes(
+    watch_history_bytes: bytes,
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+    use_cache: bool = True,
+) -> pd.DataFrame:
+    """Convenience: accept uploaded bytes and run the pipeline.
+
+    Entries are streamed and filtered to the analysis window while parsing.
+    Results are cached by content hash and window unless use_cache=False.
+    """
+    key = result_cache.cache_key(
+        result_cache.content_hash(watch_history_bytes), start=start, end=end
+    )
+    if use_cache:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+
+    history = list(iter_history(io.BytesIO(watch_history_bytes), start, end))
+    final_df = run_pipeline(history, start=start, end=end)
+    if use_cache:
+        result_cache.put(key, final_df)
+    return final_df
 
 
-def run_from_str(watch_history_str: str) -> pd.DataFrame:
-    return run_from_bytes(watch_history_str.encode("utf-8"))
+def run_from_str(
+    watch_history_str: str,
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+) -> pd.DataFrame:
+    return run_from_bytes(watch_history_str.encode("utf-8"), start, end)
+
+
+def frame_to_bytes(final_df: pd.DataFrame) -> bytes:
+    """Arrow IPC (Feather) bytes of a result; dtypes survive the round trip."""
+    buf = io.BytesIO()
+    final_df.to_feather(buf, compression="lz4")
+    return buf.getvalue()
+
+
+def frame_from_bytes(data: bytes) -> pd.DataFrame:
+    return pd.read_feather(io.BytesIO(data))
+
+
+def run_job(
+    history: List[dict],
+    start: Optional[date] = DEFAULT_START,
+    end: Optional[date] = DEFAULT_END,
+    run_key: Optional[str] = None,
+    progress: Optional[Callable[[int, str], None]] = None,
+    profile: Optional[str] = None,
+) -> Tuple[bytes, Dict[str, Any]]:
+    """Worker-process entry point: run_incremental, returning (frame_to_bytes, stats).
+
+    With a run_key the result is also stored in the result cache. profile=
+    "cprofile" or "pyinstrument" profiles this run; the saved profile's path
+    and a text summary are returned in stats["profile"].
+    """
+    stats: Dict[str, Any] = {}
+    if profile:
+        with instrumentation.profiled(profile) as stats["profile"]:
+            final_df = run_incremental(
+                history, stats=stats, start=start, end=end, progress=progress
+            )
+    else:
+        final_df = run_incremental(history, stats=stats, start=start, end=end, progress=progress)
+    if run_key is not None:
+        result_cache.put(run_key, final_df)
+    return frame_to_bytes(final_df), stats
 
 
 __all__ = [
     "run_pipeline",
+    "run_incremental",
+    "compact_dtypes",
+    "column_memory",
+    "clean_chained",
+    "clean_fused",
     "run_from_bytes",
     "run_from_str",
+    "run_job",
+    "warm_up",
+    "frame_to_bytes",
+    "frame_from_bytes",
     "dataframes_to_csv_bytes",
     "compute_kpis",
     "build_plotly_figures",
     "maybe_catplot",
 ]
+
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
@@ -0,0 +1,101 @@
+"""
+Process-wide, content-addressed cache of pipeline results.
+
+Results are keyed by a hash of the uploaded bytes plus the pipeline
+parameters, so the same export re-uploaded from another tab, after a restart
+or under another file name is served from disk, while two different files
+that share a name never collide. Frames are stored as Parquet and evicted
+least-recently-used once the cache exceeds its byte budget.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from atomic_file import atomic_write
+
+
+CACHE_DIR = Path(os.environ.get("YWH_RESULT_CACHE_DIR", "result_cache"))
+MAX_BYTES = int(os.environ.get("YWH_RESULT_CACHE_BYTES", 512 * 1024 * 1024))
+
+# Bump when the pipeline output changes so stale results are not served
+RESULT_VERSION = 1
+
+# Step 3's dedup key (see 3_deduplicate.py) changes results without a bump
+DEDUP_KEY = os.environ.get("YWH_DEDUP_KEY", "title")
+
+_lock = threading.Lock()
+
+
+def content_hash(data):
+    """sha256 hex digest of the uploaded bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(data_hash, **params):
+    """Key for one upload analyzed with the given pipeline parameters."""
+    payload = json.dumps(
+        {"data": data_hash, "version": RESULT_VERSION, "dedup_key": DEDUP_KEY, **params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _path(key):
+    return CACHE_DIR / f"{key}.parquet"
+
+
+def exists(key):
+    """Whether a result is cached for `key`, without reading it."""
+    return _path(key).exists()
+
+
+def get(key):
+    """Cached final_df for `key`, or None."""
+    path = _path(key)
+    try:
+        df = pd.read_parquet(path)
+    except (OSError, ValueError):
+        return None
+
+    # Reads refresh the entry for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def put(key, df):
+    """Store final_df under `key`, then evict down to the byte budget."""
+    with _lock:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        atomic_write(
+            _path(key), lambda tmp: df.to_parquet(tmp, index=False, compression="zstd")
+        )
+        _evict()
+
+
+def _evict():
+    entries = []
+    for path in CACHE_DIR.glob("*.parquet"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_BYTES:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
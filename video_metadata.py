@@ -0,0 +1,108 @@
+"""
+Compact per-video metadata record.
+
+One VideoMetadata per fetched video replaces the nested snippet /
+contentDetails / statistics dicts: only the fields the merge step reads,
+with native types (published_at is epoch seconds). Records serialize to a
+short JSON array for the metadata store and pickle as plain tuples.
+"""
+
+from datetime import datetime, timezone
+import json
+
+
+class VideoMetadata:
+    __slots__ = (
+        "video_id",
+        "title",
+        "channel",
+        "published_at",
+        "category_id",
+        "duration_seconds",
+        "views",
+        "likes",
+    )
+
+    def __init__(
+        self,
+        video_id,
+        title,
+        channel,
+        published_at,
+        category_id,
+        duration_seconds,
+        views,
+        likes,
+    ):
+        self.video_id = video_id
+        self.title = title
+        self.channel = channel
+        self.published_at = published_at
+        self.category_id = category_id
+        self.duration_seconds = duration_seconds
+        self.views = views
+        self.likes = likes
+
+    def to_row(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def dumps(self):
+        """JSON array of every field but video_id (the store's key)."""
+        return json.dumps(self.to_row()[1:], ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, video_id, data):
+        """Record stored by dumps(), or by older versions as a nested dict."""
+        value = json.loads(data)
+        if isinstance(value, dict):
+            return cls.from_legacy(video_id, value)
+        return cls(video_id, *value)
+
+    @classmethod
+    def from_legacy(cls, video_id, record):
+        snippet = record.get("snippet") or {}
+        content = record.get("contentDetails") or {}
+        stats = record.get("statistics") or {}
+        if "publishedAt_sql" in snippet:
+            published_at = parse_timestamp(snippet["publishedAt_sql"], "%Y-%m-%d %H:%M:%S")
+        else:
+            published_at = parse_timestamp(snippet.get("publishedAt"))
+        return cls(
+            video_id,
+            snippet.get("title"),
+            snippet.get("channelTitle"),
+            published_at,
+            snippet.get("categoryId"),
+            content.get("duration_seconds"),
+            stats.get("viewCount"),
+            stats.get("likeCount"),
+        )
+
+    def __getstate__(self):
+        return self.to_row()
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, VideoMetadata) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"VideoMetadata{self.to_row()!r}"
+
+
+def parse_timestamp(value, fmt=None):
+    """Epoch seconds of an ISO-8601 (or `fmt`, taken as UTC) timestamp."""
+    if not value:
+        return None
+    try:
+        if fmt:
+            dt = datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+        else:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+    except ValueError:
+        return None
@@ -15,29 +15,100 @@ def clean_layout(fig):
     return fig
 
 
-def create_charts(df):
+DOW_ORDER = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+MONTH_ABBR = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+              "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# Channels kept per ranking in the cube
+TOP_CHANNELS = 10
+
+
+class ChartCube:
     """
-    Generates all Plotly charts from the dataframe.
-    Returns a dictionary of figures.
+    Everything the dashboard draws, aggregated once from final_df.
+
+    `cells` holds watch hours and video counts per
+    hour x weekday x month x category x type (month is year * 12 + month - 1,
+    so multi-year windows keep their years apart); the channel tables hold
+    the top channels by watch hours and by watch count. Its size depends on
+    the number of distinct cells, not on the number of rows.
     """
 
-    # Pre-processing for Plotly charts
-    # Ensure date column is datetime
-    if not pd.api.types.is_datetime64_any_dtype(df["watched_at"]):
-        df["watched_at"] = pd.to_datetime(df["watched_at"])
+    def __init__(self, cells, channel_hours, channel_counts, first, last):
+        self.cells = cells
+        self.channel_hours = channel_hours
+        self.channel_counts = channel_counts
+        self.first = first
+        self.last = last
+
 
-    df["watch_hours"] = df["duration_seconds"] / 3600
-    df["month"] = df["watched_at"].dt.strftime("%b")
-    df["month_num"] = df["watched_at"].dt.month
+def build_cube(df, top_k=TOP_CHANNELS):
+    """Aggregate final_df into a ChartCube without modifying it."""
+    watched_at = df["watched_at"]
+    if not pd.api.types.is_datetime64_any_dtype(watched_at):
+        watched_at = pd.to_datetime(watched_at)
 
-    figs = {}
+    watch_hours = df["duration_seconds"].astype("float64") / 3600
+    frame = pd.DataFrame(
+        {
+            "hour": watched_at.dt.hour.astype("Int8"),
+            "weekday": watched_at.dt.dayofweek.astype("Int8"),
+            "month": (watched_at.dt.year * 12 + watched_at.dt.month - 1).astype("Int32"),
+            "category": df["category"].astype(object),
+            "type": df["type"].astype(object),
+            "watch_hours": watch_hours,
+        }
+    )
+    cells = (
+        frame.groupby(
+            ["hour", "weekday", "month", "category", "type"],
+            dropna=False,
+            sort=False,
+        )["watch_hours"]
+        .agg(["sum", "size"])
+        .rename(columns={"sum": "watch_hours", "size": "count"})
+        .reset_index()
+    )
+
+    channels = (
+        pd.DataFrame(
+            {"channel": df["channel"], "watch_hours": watch_hours, "title": df["title"]}
+        )
+        .groupby("channel", observed=True)
+        .agg(watch_hours=("watch_hours", "sum"), count=("title", "count"))
+    )
+    channel_hours = channels["watch_hours"].nlargest(top_k).reset_index()
+    channel_counts = channels["count"].nlargest(top_k).reset_index()
+    channel_hours["channel"] = channel_hours["channel"].astype(str)
+    channel_counts["channel"] = channel_counts["channel"].astype(str)
+
+    return ChartCube(
+        cells, channel_hours, channel_counts, watched_at.min(), watched_at.max()
+    )
+
+
+def kpi_figure(cube, days=None):
+    """KPI hero: total hours, total videos and daily average."""
+    cells = cube.cells
 
     # 1. KPI HERO (3 Cols)
-    total_watch_hours = df["watch_hours"].sum()
-    total_video_count = len(df)
+    total_watch_hours = cells["watch_hours"].sum()
+    total_video_count = int(cells["count"].sum())
+
+    if days is None:
+        span = cube.last - cube.first
+        days = span.days + 1 if pd.notna(span) else 1
 
     # Avoid division by zero if empty
-    daily_avg_total_hours = total_watch_hours / 365
+    daily_avg_total_hours = total_watch_hours / max(days, 1)
     daily_avg_hours_int = int(daily_avg_total_hours)
     daily_avg_minutes = int(round((daily_avg_total_hours - daily_avg_hours_int) * 60))
 
@@ -88,33 +159,39 @@ def create_charts(df):
         margin=dict(t=40, b=20, l=60, r=20),
         height=250,
     )
-    figs["kpi"] = fig_kpi
+    return _lock_axes(fig_kpi)
+
+
+def mix_figure(cube):
+    """Short vs long-form donut next to the top categories treemap."""
+    cells = cube.cells
 
     # 2. Donut + Treemap (1 Row)
-    type_counts = df["type"].value_counts().reset_index()
-    type_counts.columns = ["type", "count"]
+    type_counts = (
+        cells.groupby("type")["count"]
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+        .reset_index()
+    )
 
     cat_summary = (
-        df.groupby("category")["watch_hours"]
+        cells.groupby("category")["watch_hours"]
         .sum()
         .reset_index()
         .sort_values("watch_hours", ascending=False)
         .head(6)
     )
 
-    # Create Treemap using px to get the trace with correct colors
     treemap_colors = ["#2b2b2b", "#3a3a3a", "#4a4a4a", "#5a5a5a", "#6a6a6a", "#7a7a7a"]
-    # Map colors to categories explicitly to ensure order (Largest -> Darkest/First)
-    color_map = dict(zip(cat_summary["category"], treemap_colors))
-
-    fig_tm_temp = px.treemap(
-        cat_summary,
-        path=["category"],
-        values="watch_hours",
-        color="category",
-        color_discrete_map=color_map,
-    )
-    fig_tm_temp.update_traces(
+    # Largest category gets the darkest/first color
+    categories = cat_summary["category"].astype(str).tolist()
+    treemap = go.Treemap(
+        ids=categories,
+        labels=categories,
+        parents=[""] * len(categories),
+        values=cat_summary["watch_hours"],
+        branchvalues="total",
+        marker=dict(colors=treemap_colors[: len(categories)]),
         hovertemplate="<b>%{label}</b><br>Watch Hours: %{value:.1f}<extra></extra>",
         textfont=dict(size=18),
     )
@@ -142,7 +219,7 @@ def create_charts(df):
         col=1,
     )
 
-    fig_mixed.add_trace(fig_tm_temp.data[0], row=1, col=2)
+    fig_mixed.add_trace(treemap, row=1, col=2)
 
     fig_mixed.update_layout(
         paper_bgcolor="#0f0f0f",
@@ -151,17 +228,22 @@ def create_charts(df):
         margin=dict(t=60, b=20, l=20, r=20),
         height=400,
     )
-    figs["mixed"] = fig_mixed
+    return _lock_axes(fig_mixed)
+
+
+def trend_figure(cube):
+    """Monthly watch hours trend."""
+    cells = cube.cells
 
     # 3. Monthly Trend (Area)
-    monthly = (
-        df.groupby(["month_num", "month"])["watch_hours"]
-        .sum()
-        .reset_index()
-        .sort_values("month_num")
-    )
+    monthly = cells.groupby("month")["watch_hours"].sum().reset_index()
+    monthly["label"] = [f"{MONTH_ABBR[m % 12]} {m // 12}" for m in monthly["month"]]
     fig_trend = px.area(
-        monthly, x="month", y="watch_hours", title="Monthly Watch Hours Trend"
+        monthly,
+        x="label",
+        y="watch_hours",
+        title="Monthly Watch Hours Trend",
+        labels={"label": "month"},
     )
     fig_trend.update_traces(
         line_color="#3498db",
@@ -170,13 +252,14 @@ def create_charts(df):
         hovertemplate="<b>%{x}</b><br>Watch Hours: %{y:.1f} hrs<extra></extra>",
     )
     clean_layout(fig_trend)
-    figs["trend"] = fig_trend
+    return _lock_axes(fig_trend)
+
 
+def channels_figure(cube):
+    """Top channels by watch hours and by watch count."""
     # 4. Watch Hours and Watch Count by Channel (facing bars)
-    chan_hours = df.groupby("channel")["watch_hours"].sum().nlargest(10).reset_index()
-    # Handle cases where we might have fewer than 10 channels
-    n_head = min(10, len(chan_hours))
-    chan_count = df.groupby("channel")["title"].count().nlargest(n_head).reset_index()
+    chan_hours = cube.channel_hours
+    chan_count = cube.channel_counts
 
     fig_channels = make_subplots(
         rows=1,
@@ -200,7 +283,7 @@ def create_charts(df):
     fig_channels.add_trace(
         go.Bar(
             y=chan_count["channel"],
-            x=chan_count["title"],
+            x=chan_count["count"],
             orientation="h",
             marker_color="#6c7a89",
             name="Watch Count",
@@ -226,12 +309,15 @@ def create_charts(df):
     fig_channels.update_yaxes(
         showgrid=False, categoryorder="total ascending", side="right", row=1, col=2
     )
-    figs["channels"] = fig_channels
+    return _lock_axes(fig_channels)
+
+
+def hour_figure(cube):
+    """Watch hours by hour of day."""
+    cells = cube.cells
 
     # 5. Time of Day (Watch Hours)
-    hourly = df.copy()
-    hourly["hour"] = hourly["watched_at"].dt.hour
-    hourly_summary = hourly.groupby("hour")["watch_hours"].sum()
+    hourly_summary = cells.groupby("hour")["watch_hours"].sum()
     hourly_summary = hourly_summary.reindex(range(24), fill_value=0).reset_index()
     hourly_summary.columns = ["hour", "watch_hours"]
     fig_hour = px.bar(
@@ -246,30 +332,24 @@ def create_charts(df):
         hovertemplate="<b>%{x}:00</b><br>Watch Hours: %{y:.1f}<extra></extra>"
     )
     fig_hour.update_layout(margin=dict(t=60, b=40, l=30, r=20), xaxis=dict(dtick=1))
-    figs["hour"] = fig_hour
+    return _lock_axes(fig_hour)
+
+
+def dow_figure(cube):
+    """Watch hours by day of week."""
+    cells = cube.cells
 
     # 6. Day of Week by Watch Hours (Polar)
-    dow_order = [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
-    ]
     dow_summary = (
-        df.groupby(df["watched_at"].dt.day_name())["watch_hours"]
-        .sum()
-        .reindex(dow_order)
-        .reset_index()
+        cells.groupby("weekday")["watch_hours"].sum().reindex(range(7)).reset_index()
     )
     dow_summary.columns = ["day_of_week", "watch_hours"]
+    dow_summary["day_of_week"] = DOW_ORDER
     fig_dow = px.bar_polar(
         dow_summary,
         r="watch_hours",
         theta="day_of_week",
-        category_orders={"day_of_week": dow_order},
+        category_orders={"day_of_week": DOW_ORDER},
         template="plotly_dark",
     )
     fig_dow.update_traces(
@@ -281,12 +361,41 @@ def create_charts(df):
         paper_bgcolor="#0f0f0f",
         font_color="white",
     )
-    figs["dow"] = fig_dow
+    return _lock_axes(fig_dow)
+
 
+def _lock_axes(fig):
     # Disable zoom and pan needed for mobile accidental touches
-    for key in figs:
-        figs[key].update_layout(dragmode=False)
-        figs[key].update_xaxes(fixedrange=True)
-        figs[key].update_yaxes(fixedrange=True)
+    fig.update_layout(dragmode=False)
+    fig.update_xaxes(fixedrange=True)
+    fig.update_yaxes(fixedrange=True)
+    return fig
+
+
+FIGURES = {
+    "kpi": kpi_figure,
+    "mixed": mix_figure,
+    "trend": trend_figure,
+    "channels": channels_figure,
+    "hour": hour_figure,
+    "dow": dow_figure,
+}
+
 
-    return figs
+def build_figure(cube, name, days=None):
+    """One dashboard figure by name; `days` only affects the KPI figure."""
+    if name == "kpi":
+        return kpi_figure(cube, days)
+    return FIGURES[name](cube)
+
+
+def create_charts(data, days=None):
+    """
+    Generates all Plotly charts from a ChartCube (or final_df, which is
+    aggregated first).
+    `days` is the length of the analysis window used for the daily average
+    (defaults to the span of the data).
+    Returns a dictionary of figures.
+    """
+    cube = data if isinstance(data, ChartCube) else build_cube(data)
+    return {name: build_figure(cube, name, days) for name in FIGURES}
@@ -0,0 +1,60 @@
+"""
+Shared, pooled HTTP session for YouTube Data API requests.
+
+Reusing one session keeps TLS connections alive across batches, runs and
+sessions instead of paying a new handshake for every request.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+POOL_SIZE = int(os.environ.get("YT_HTTP_POOL_SIZE", 16))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide keep-alive session with gzip enabled."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            # Google APIs only compress responses when the user agent says gzip
+            session.headers.update(
+                {"Accept-Encoding": "gzip", "User-Agent": "ywh-analyzer (gzip)"}
+            )
+            _session = session
+        return _session
+
+
+def connection_count(url):
+    """Number of connections the session has opened to url's host so far."""
+    session = get_session()
+    adapter = session.get_adapter(url)
+    if not hasattr(adapter, "build_connection_pool_key_attributes"):
+        # requests < 2.32 keys pools by URL alone
+        return adapter.poolmanager.connection_from_url(url).num_connections
+
+    # The pool requests itself picks: keyed with the TLS settings a
+    # session.get(url) would use, not just the URL
+    settings = session.merge_environment_settings(url, {}, None, None, None)
+    host_params, pool_kwargs = adapter.build_connection_pool_key_attributes(
+        requests.Request("GET", url).prepare(), settings["verify"], settings["cert"]
+    )
+    pool = adapter.poolmanager.connection_from_host(**host_params, pool_kwargs=pool_kwargs)
+    return pool.num_connections
+
+
+def response_size(response):
+    """Bytes received on the wire (compressed size when gzip was used)."""
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length)
+    return len(response.content)
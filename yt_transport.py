@@ -0,0 +1,207 @@
+"""
+Record/replay transport for YouTube Data API videos.list calls.
+
+fetch_metadata sends its requests through get_transport():
+
+- live (default): the pooled session from yt_session.
+- record: the live session, with every returned item (and every requested id
+  that was not returned) saved to a gzip JSON lines cassette.
+- replay: no network at all; responses are rebuilt from the cassette for any
+  batch composition, with optional injected latency, 403/429 quota errors and
+  timeouts, so concurrency, retry and key-rotation changes can be load-tested
+  deterministically offline (fully so with YT_FETCH_WORKERS=1). Ids missing
+  from the cassette are not remembered as unavailable, and key exhaustion is
+  tracked in a scratch state file (see key_scheduler), not the real one.
+"""
+
+from pathlib import Path
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+
+from atomic_file import atomic_write
+from yt_session import get_session
+
+
+MODE = os.environ.get("YT_TRANSPORT", "live")
+CASSETTE = Path(os.environ.get("YT_CASSETTE", "youtube_cassette.jsonl.gz"))
+
+# Replay fault injection
+REPLAY_LATENCY = float(os.environ.get("YT_REPLAY_LATENCY", 0))
+REPLAY_JITTER = float(os.environ.get("YT_REPLAY_JITTER", 0))
+REPLAY_403_RATE = float(os.environ.get("YT_REPLAY_403_RATE", 0))
+REPLAY_429_RATE = float(os.environ.get("YT_REPLAY_429_RATE", 0))
+REPLAY_TIMEOUT_RATE = float(os.environ.get("YT_REPLAY_TIMEOUT_RATE", 0))
+REPLAY_SEED = int(os.environ.get("YT_REPLAY_SEED", 0))
+
+logger = logging.getLogger(__name__)
+
+
+class Cassette:
+    """videos.list items by video id; None marks an id the API did not return."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.items = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.items[entry["id"]] = entry["item"]
+
+    def record(self, ids, items):
+        by_id = {item["id"]: item for item in items}
+        with self._lock:
+            for video_id in ids:
+                self.items[video_id] = by_id.get(video_id)
+            self._dirty = True
+
+    def save(self):
+        """Rewrite the cassette atomically if anything was recorded."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            def write(tmp_path):
+                with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                    for video_id, item in self.items.items():
+                        f.write(json.dumps({"id": video_id, "item": item}) + "\n")
+
+            atomic_write(self.path, write)
+            self._dirty = False
+
+
+class CassetteResponse:
+    """The parts of requests.Response that fetch_metadata uses."""
+
+    def __init__(self, status_code, payload, url, unrecorded=()):
+        self.status_code = status_code
+        self.url = url
+        # Requested ids the cassette knows nothing about (not "not returned")
+        self.unrecorded = unrecorded
+        self.content = json.dumps(payload).encode()
+        self.headers = {"Content-Length": str(len(self.content))}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} replayed error", response=self)
+
+
+def _error(code, reason):
+    return {"error": {"code": code, "errors": [{"reason": reason}]}}
+
+
+class LiveTransport:
+    def __init__(self, session):
+        self.session = session
+
+    def get(self, url, params, timeout):
+        return self.session.get(url, params=params, timeout=timeout)
+
+    def save(self):
+        pass
+
+
+class RecordingTransport(LiveTransport):
+    def __init__(self, session, cassette):
+        super().__init__(session)
+        self.cassette = cassette
+
+    def get(self, url, params, timeout):
+        r = self.session.get(url, params=params, timeout=timeout)
+        if r.status_code == 200:
+            self.cassette.record(params["id"].split(","), r.json().get("items", []))
+        return r
+
+    def save(self):
+        self.cassette.save()
+
+
+class ReplayTransport:
+    def __init__(
+        self,
+        cassette,
+        latency=REPLAY_LATENCY,
+        jitter=REPLAY_JITTER,
+        rate_403=REPLAY_403_RATE,
+        rate_429=REPLAY_429_RATE,
+        timeout_rate=REPLAY_TIMEOUT_RATE,
+        seed=REPLAY_SEED,
+    ):
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_403 = rate_403
+        self.rate_429 = rate_429
+        self.timeout_rate = timeout_rate
+        self.unrecorded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def get(self, url, params, timeout):
+        ids = params["id"].split(",")
+        with self._lock:
+            roll = self._random.random()
+            delay = self.latency + self._random.random() * self.jitter
+
+        if roll < self.timeout_rate:
+            time.sleep(min(delay, timeout))
+            raise requests.Timeout(f"Replayed timeout for {len(ids)} ids")
+        time.sleep(delay)
+
+        roll -= self.timeout_rate
+        if roll < self.rate_403:
+            return CassetteResponse(403, _error(403, "quotaExceeded"), url)
+        if roll - self.rate_403 < self.rate_429:
+            return CassetteResponse(429, _error(429, "rateLimitExceeded"), url)
+
+        items = []
+        unrecorded = []
+        for video_id in ids:
+            if video_id not in self.cassette.items:
+                unrecorded.append(video_id)
+                continue
+            item = self.cassette.items[video_id]
+            if item is not None:
+                items.append(item)
+        if unrecorded:
+            with self._lock:
+                self.unrecorded += len(unrecorded)
+        return CassetteResponse(200, {"items": items}, url, unrecorded)
+
+    def save(self):
+        if self.unrecorded:
+            logger.warning("%d requested ids were not in the cassette", self.unrecorded)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Process-wide transport for videos.list calls, chosen by YT_TRANSPORT."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            if MODE == "live":
+                _transport = LiveTransport(get_session())
+            elif MODE == "record":
+                _transport = RecordingTransport(get_session(), Cassette(CASSETTE))
+            elif MODE == "replay":
+                _transport = ReplayTransport(Cassette(CASSETTE))
+            else:
+                raise ValueError(f"Unknown YT_TRANSPORT: {MODE}")
+        return _transport